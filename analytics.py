@@ -0,0 +1,138 @@
+"""Deal quality over a product's whole price history
+
+Keepa histories are step functions: a price holds until the next point.
+Everything here works on that history resampled to the price in effect at
+the end of each day, which weights prices by how long they lasted (a
+one-hour spike counts for a day at most, a price that held for months
+counts for months) and bounds the work by the number of days looked at.
+Each statistic is a single vectorized pass.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# How much history "usual" prices and drop odds are based on
+LOOKBACK_DAYS = 365
+# Window of the rolling median used as the typical price
+TYPICAL_WINDOW_DAYS = 90
+# The price it "usually sells for": exceeded only this share of the time
+REFERENCE_PERCENTILE = 90
+# Drop odds: chance of a drop of at least MIN_DROP within DROP_HORIZON_DAYS,
+# judged from past days whose price was within SIMILAR_PRICE of today's
+DROP_HORIZON_DAYS = 30
+MIN_DROP = 0.02
+SIMILAR_PRICE = 0.05
+MIN_SIMILAR_DAYS = 14
+# Within this fraction of the all-time low counts as "at the low"
+LOW_TOLERANCE = 0.01
+
+_DAY = np.timedelta64(1, 'D')
+
+
+def daily_prices(series, days=LOOKBACK_DAYS, now=None):
+    """Return the price in effect at the end of each of the last `days` days, oldest first
+
+    Days before the series starts are left out, so a new product gives a
+    shorter array.
+    """
+    if series.empty:
+        return np.array([])
+    now = _now(series, now)
+    start = max(series.times[0], now - days * _DAY)
+    # Always includes today, even for a product first seen today
+    day_ends = np.arange(now, start - _DAY, -_DAY)[::-1]
+    # Index of the last point at or before each day end; a price holds until the next point
+    last = np.searchsorted(series.times, day_ends, side='right') - 1
+    return series.prices[last[last >= 0]]
+
+
+def rolling_median(daily, window=TYPICAL_WINDOW_DAYS):
+    """Rolling median of a daily price array; one value per full window"""
+    if len(daily) == 0:
+        return daily
+    window = min(window, len(daily))
+    return np.median(sliding_window_view(daily, window), axis=1)
+
+
+def percentile_rank(daily, price):
+    """Share of days (0-100) the price was lower than `price`, counting ties as half"""
+    if len(daily) == 0:
+        return None
+    below = np.count_nonzero(daily < price)
+    equal = np.count_nonzero(daily == price)
+    return float((below + equal / 2) / len(daily) * 100)
+
+
+def share_of_days(daily, price):
+    """Share of days (0-100) priced strictly below and strictly above `price`
+
+    Unlike percentile_rank, days at exactly `price` count for neither, so
+    these can be quoted as "cheaper than now X% of the time".
+    """
+    if len(daily) == 0:
+        return None, None
+    return (float(np.count_nonzero(daily < price) / len(daily) * 100),
+            float(np.count_nonzero(daily > price) / len(daily) * 100))
+
+
+def days_since_low(series, now=None, tolerance=LOW_TOLERANCE):
+    """Days since the price was last within tolerance of its all-time low (0 if it is now)"""
+    if series.empty:
+        return None
+    near_low = series.prices <= series.lowest_price * (1 + tolerance)
+    if near_low[-1]:
+        return 0.0
+    # The low ended when the first point after the last near-low point arrived
+    left_low = series.times[np.flatnonzero(near_low)[-1] + 1]
+    return float((_now(series, now) - left_low) / _DAY)
+
+
+def drop_probability(daily, price, horizon=DROP_HORIZON_DAYS, min_drop=MIN_DROP):
+    """Estimated chance the price drops by min_drop or more within `horizon` days
+
+    The share of past days priced like today after which the price fell
+    that far within the horizon; all past days are used if too few were
+    priced like today. None if the history is shorter than the horizon.
+    """
+    days = len(daily) - horizon
+    if days <= 0:
+        return None
+    future_min = sliding_window_view(daily[1:], horizon).min(axis=1)[:days]
+    dropped = future_min < daily[:days] * (1 - min_drop)
+    similar = np.abs(daily[:days] / price - 1) <= SIMILAR_PRICE
+    if np.count_nonzero(similar) >= MIN_SIMILAR_DAYS:
+        dropped = dropped[similar]
+    return float(dropped.mean())
+
+
+def deal_stats(series, now=None):
+    """Return the deal-quality stats for a PriceSeries, or None if it's empty
+
+    typical_price is the latest 90-day rolling median, reference_price
+    the price it sold at or below 90% of the last year, percentile_rank
+    where today's price ranks in the last year (ties count half), and
+    cheaper_share / pricier_share the share of the last year it was
+    strictly cheaper / more expensive than now.
+    """
+    if series.empty:
+        return None
+    current = series.current_price
+    daily = daily_prices(series, now=now)
+    since_low = days_since_low(series, now)
+    cheaper_share, pricier_share = share_of_days(daily, current)
+    return {
+        'typical_price': float(rolling_median(daily)[-1]),
+        'reference_price': float(np.percentile(daily, REFERENCE_PERCENTILE)),
+        'percentile_rank': percentile_rank(daily, current),
+        'cheaper_share': cheaper_share,
+        'pricier_share': pricier_share,
+        'days_since_low': since_low,
+        'at_low': since_low == 0,
+        'drop_probability': drop_probability(daily, current),
+        'days_analyzed': int(len(daily)),
+    }
+
+
+def _now(series, now):
+    """The analysis end time: now, but never before the newest point"""
+    now = np.datetime64('now', 's') if now is None else np.datetime64(now, 's')
+    return max(now, series.times[-1])
@@ -1,16 +1,187 @@
+# Only what first paint needs is imported here. keepa, altair, pandas and the
+# scraping stack load on first use, once a product is looked up; keep it that
+# way (python benchmarks/importtime.py checks it)
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.ticker import FuncFormatter
-from datetime import datetime, timedelta
-import altair as alt
-import keepa
-import requests
-from bs4 import BeautifulSoup
-import re
-import time
-from utils import extract_asin, get_amazon_product_info, search_walmart, girl_math_logic
+import os
+import uuid
+from utils import extract_asin, extract_asins, girl_math_logic
+from cache import DEFAULT_TTL
+from watchlist import DEFAULT_OWNER, Watchlist, PriceWatchScheduler
+from components import THEME_CSS, girl_math_box, history_pages, history_table, link_button, markdown_escape, store_card
+from stores import STORES, start_store_searches, collect_store_results
+from service import KeepaBudgetExceeded, get_lookup_service
+from tracing import span, begin_collect, registry, render_openmetrics, start_metrics_server
+
+# Longest we'll wait on the other stores before showing the rest of the results
+STORE_TIMEOUT = 10
+# Show the comparison once this many stores have found the product, without
+# waiting on the slower ones; 0 waits for every store
+STORE_MIN_RESULTS = int(os.environ.get("GIRL_MATH_STORE_MIN_RESULTS", 2)) or None
+# Most points we send to the Price History chart, and the most we'll draw markers on
+CHART_MAX_POINTS = 1000
+CHART_MARKER_POINTS = 150
+# Set to serve Prometheus/OpenMetrics text on http://<host>:<port>/metrics
+METRICS_PORT = os.environ.get("GIRL_MATH_METRICS_PORT")
+
+if METRICS_PORT:
+    start_metrics_server(int(METRICS_PORT))
+
+# Timings for this rerun only, shown in the debug panel
+rerun_spans = begin_collect()
+
+
+def girl_math_statement(current_price, peak_price, lowest_price, deal=None):
+    """Generate a fun girl math statement based on the price situation
+
+    With deal stats (analytics.deal_stats) the statement follows where the
+    price sits in its last year rather than against the all-time peak.
+    """
+    statements = [
+        f"That's like getting paid ${peak_price - current_price:.2f} to shop!",
+        "Remember, if it's on sale, it's basically saving money!",
+        "If you use it 10 times, it's only $" + f"{current_price/10:.2f}" + " per use!",
+        "That's only " + f"{current_price/30:.2f}" + " per day for a month!",
+        "Buy now, your future self will thank you!",
+        "It's an investment in your happiness!",
+        "If you return something else, this is basically free!",
+        "You've already saved money by not buying it at the peak price!"
+    ]
+    
+    if deal is None:
+        if current_price <= lowest_price * 1.1:
+            return "This is literally the LOWEST price! It would be irresponsible NOT to buy it!"
+        elif current_price <= peak_price * 0.8:
+            return "That's a MAJOR discount! It's like they're paying you to take it!"
+        else:
+            import random
+            return random.choice(statements)
+    
+    if deal['at_low']:
+        return "This is literally the LOWEST price! It would be irresponsible NOT to buy it!"
+    if deal['percentile_rank'] <= 20:
+        return f"It's been more expensive {deal['pricier_share']:.0f}% of the past year. Basically free!"
+    if current_price <= deal['typical_price'] * 0.8:
+        return "That's a MAJOR discount! It's like they're paying you to take it!"
+    if deal['drop_probability'] is not None and deal['drop_probability'] >= 0.6:
+        return "Girl math says wait: it usually drops from here within a month, and not buying is 100% savings!"
+    if current_price < deal['reference_price']:
+        return f"That's like getting paid ${deal['reference_price'] - current_price:.2f} to shop!"
+    return "If you use it 10 times, it's only $" + f"{current_price/10:.2f}" + " per use!"
+
+
+@st.cache_resource
+def get_keepa_client(api_key):
+    """One Keepa client per API key, shared across reruns and sessions"""
+    import keepa
+    return keepa.Keepa(api_key)
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def cached_extract_asin(amazon_url):
+    """extract_asin, memoized on the pasted URL"""
+    return extract_asin(amazon_url)
+
+
+@st.cache_data(max_entries=100, show_spinner=False)
+def cached_extract_asins(text):
+    """extract_asins, memoized on the pasted text"""
+    return extract_asins(text)
+
+
+@st.cache_data(ttl=DEFAULT_TTL, max_entries=500, show_spinner=False)
+def load_product_info(_api, asin, _user=None, domain='US'):
+    """Keepa product info, memoized on (asin, domain)
+
+    The client and user are left out of the cache key so every API key and
+    session shares results. Misses go through the lookup service, which
+    charges the Keepa tokens to _user's share.
+    """
+    product_info = get_lookup_service().product_info(_api, asin, user=_user, domain=domain)
+    if product_info is None:
+        # Raising keeps failed lookups out of the cache so the next rerun retries
+        raise LookupError(f"Couldn't retrieve product information for {asin}")
+    return product_info
+
+
+@st.cache_data(ttl=DEFAULT_TTL, max_entries=200, show_spinner=False)
+def build_price_chart(asin, last_seen, _price_series):
+    """Altair price history chart, memoized on the ASIN and its newest point
+
+    The series itself is not hashed; last_seen changes whenever new history
+    arrives, which is enough to invalidate the chart.
+    """
+    import altair as alt
+
+    # Downsampled so long histories render in bounded time
+    with span('chart_prep'):
+        chart_data = _price_series.downsample(CHART_MAX_POINTS).to_frame()
+    
+    # Create Altair chart with pink theme
+    return alt.Chart(chart_data).mark_line(
+        color='#FF69B4',
+        point=alt.OverlayMarkDef(color="#FF1493") if len(chart_data) <= CHART_MARKER_POINTS else False
+    ).encode(
+        x=alt.X('date:T', title='Date'),
+        y=alt.Y('price:Q', title='Price ($)', scale=alt.Scale(zero=False)),
+        tooltip=['date:T', 'price:Q']
+    ).properties(
+        height=300
+    ).interactive()
+
+
+@st.cache_resource
+def get_watchlist():
+    """The watchlist is shared by every session in this process"""
+    return Watchlist()
+
+
+@st.cache_resource
+def get_watch_scheduler():
+    """Start the one background price watcher for this process
+
+    It polls every owner's watches on the Keepa key stored with them, so
+    each user's watches are polled on their own key, whoever has the app
+    open, and takes only a fair share of each key from the sessions using it.
+    """
+    return PriceWatchScheduler(None, get_watchlist(), check_walmart=True, lookups=get_lookup_service()).start()
+
+
+def current_user():
+    """Who this session is: the signed-in user if the app has auth set up, else the session itself"""
+    if st.user.get('is_logged_in'):
+        return st.user.get('email')
+    return st.session_state.setdefault('user_id', uuid.uuid4().hex)
+
+
+def watch_owner():
+    """Whose watchlist this session shows: the signed-in user's
+
+    Without auth set up the app is one person's, and every session shares
+    one watchlist, so it survives reloads and new tabs.
+    """
+    if st.user.get('is_logged_in'):
+        return st.user.get('email')
+    return DEFAULT_OWNER
+
+
+def refresh_product(api, asin, user=None):
+    """Look a product up live on Keepa and forget what was cached about it
+
+    Only this product's entries are dropped, so other sessions keep their
+    cached products, charts and store prices. The arguments to the cached
+    functions' clear() must match how they're called below.
+    """
+    service = get_lookup_service()
+    stale = service.cache.get(asin)
+    fresh = service.product_info(api, asin, user=user, refresh=True)
+    load_product_info.clear(api, asin, user)
+    for info in (stale, fresh):
+        if not info:
+            continue
+        series = info['price_series']
+        build_price_chart.clear(asin, str(series.times[-1]), series)
+        service.clear_store_results(info['title'], **info.get('identifiers', {}))
+
 
 # Page configuration
 st.set_page_config(
@@ -20,88 +191,17 @@ st.set_page_config(
 )
 
 # Custom CSS for pink theme and girly fonts
-st.markdown("""
-<style>
-    /* Pink theme */
-    .main {
-        background-color: #fff0f5;
-    }
-    
-    /* Headers */
-    h1, h2, h3 {
-        font-family: 'Pacifico', cursive;
-        color: #FF69B4;
-    }
-    
-    /* General text */
-    p, div, label, span {
-        font-family: 'Quicksand', sans-serif;
-        color: #FF1493;
-    }
-    
-    /* Streamlit widgets customization */
-    .stButton button {
-        background-color: #FF69B4;
-        color: white;
-        border-radius: 20px;
-        border: none;
-        font-family: 'Quicksand', sans-serif;
-    }
-    
-    .stTextInput input {
-        border-radius: 20px;
-        border: 2px solid #FF69B4;
-    }
-    
-    /* Card-like containers */
-    .css-1r6slb0, .css-12oz5g7 {
-        background-color: white;
-        border-radius: 20px;
-        padding: 20px;
-        box-shadow: 0px 4px 12px rgba(255, 105, 180, 0.2);
-    }
-    
-    /* Success messages */
-    .element-container .stAlert {
-        background-color: #FFD1DC;
-        border: 1px solid #FF69B4;
-        border-radius: 20px;
-    }
-
-    /* Metrics */
-    .stMetric {
-        background-color: #FFD1DC;
-        border-radius: 15px;
-        padding: 10px;
-        box-shadow: 0px 4px 8px rgba(255, 105, 180, 0.1);
-    }
-
-    /* Custom chart container */
-    .chart-container {
-        background-color: white;
-        border-radius: 20px;
-        padding: 20px;
-        box-shadow: 0px 4px 12px rgba(255, 105, 180, 0.2);
-    }
-    
-    /* Footer */
-    .footer {
-        font-size: 12px;
-        text-align: center;
-        margin-top: 30px;
-        color: #FF69B4;
-    }
-</style>
-
-<!-- Import girly fonts -->
-<link href="https://fonts.googleapis.com/css2?family=Pacifico&family=Quicksand:wght@400;700&display=swap" rel="stylesheet">
-""", unsafe_allow_html=True)
+st.markdown(THEME_CSS, unsafe_allow_html=True)
 
 # App Header
 st.title("✨ Girl Math Deal Finder 💅")
 st.markdown("### Find the best deals and justify your shopping with Girl Math! 💸💖")
 st.markdown("---")
 
+# Keepa tokens are shared out per session, watches and alerts per user
+user_id = current_user()
+owner = watch_owner()
+
 # Sidebar with explanation
 with st.sidebar:
     st.markdown("## 💁‍♀️ What is Girl Math?")
@@ -122,7 +222,7 @@ with st.sidebar:
     1. Paste an Amazon product URL
     2. Wait for the price analysis
     3. See the Girl Math savings!
-    4. Compare with Walmart prices
+    4. Compare with Walmart, Target and Best Buy prices
     5. Make a justified purchase 💕
     """)
     
@@ -132,12 +232,31 @@ with st.sidebar:
     keepa_api_key = st.text_input("Keepa API Key", type="password", value=st.secrets.get("KEEPA_API_KEY", ""))
     if not keepa_api_key:
         st.warning("Please enter your Keepa API Key to access price history")
+    show_timings = st.checkbox("🐞 Show stage timings")
+    
+    # Watched products and the latest price alerts
+    watchlist = get_watchlist()
+    watch_count = watchlist.count(owner)
+    if watch_count:
+        st.markdown("---")
+        st.markdown(f"## 👀 Watchlist ({watch_count})")
+        for event in watchlist.events(limit=5, owner=owner):
+            if event['kind'] == 'below_threshold':
+                st.success(f"{markdown_escape(event['title'])} dropped to \\${event['current_price']:.2f} (your target: \\${event['threshold']:.2f})")
+            else:
+                st.success(f"{markdown_escape(event['title'])} is at its lowest price ever: \\${event['current_price']:.2f}")
 
 # Main content
 col1, col2 = st.columns([3, 1])
 
 with col1:
     amazon_url = st.text_input("Paste an Amazon Product Link:", placeholder="https://www.amazon.com/dp/...")
+    with st.expander("🛍️ Got a whole wishlist? Paste many links at once"):
+        wishlist_text = st.text_area("Paste links, an email or a spreadsheet column:", placeholder="https://www.amazon.com/dp/...\nhttps://www.amazon.com/dp/...")
+
+with col2:
+    # Reruns reuse cached lookups, this forces a live one
+    refresh_requested = st.button("🔄 Refresh prices")
 
 # Initialize session state for tracking past searches
 if 'search_history' not in st.session_state:
@@ -145,7 +264,7 @@ if 'search_history' not in st.session_state:
 
 # Process the URL
 if amazon_url:
-    asin = extract_asin(amazon_url)
+    asin = cached_extract_asin(amazon_url)
     
     if asin:
         with st.spinner("💖 Applying Girl Math magic to find you a deal..."):
@@ -155,10 +274,18 @@ if amazon_url:
                     st.error("Please enter your Keepa API Key in the sidebar to continue")
                     st.stop()
                 
-                api = keepa.Keepa(keepa_api_key)
+                api = get_keepa_client(keepa_api_key)
                 
                 # Get product details
-                product_info = get_amazon_product_info(api, asin)
+                try:
+                    if refresh_requested:
+                        refresh_product(api, asin, user_id)
+                    product_info = load_product_info(api, asin, user_id)
+                except LookupError:
+                    product_info = None
+                except KeepaBudgetExceeded as e:
+                    st.warning(f"So many shoppers right now! Try again in {e.retry_after:.0f} seconds 💕")
+                    st.stop()
                 
                 if not product_info:
                     st.error("Couldn't retrieve product information. Please check the URL or try again later.")
@@ -166,11 +293,16 @@ if amazon_url:
                 
                 product_title = product_info['title']
                 
+                # The other stores only need the title, so start them now and let
+                # them run while we build the chart and price analysis
+                store_futures = start_store_searches(
+                    product_title, search=get_lookup_service().store_result, **product_info.get('identifiers', {})
+                )
+                
                 # Display product info
-                st.markdown(f"## {product_title}")
+                st.markdown(f"## {markdown_escape(product_title)}")
                 
                 # Extract relevant price data
-                price_data = product_info['price_data']
                 current_price = product_info['current_price']
                 peak_price = product_info['peak_price']
                 lowest_price = product_info['lowest_price']
@@ -178,28 +310,11 @@ if amazon_url:
                 # Create price history chart
                 st.markdown("### 📈 Price History")
                 
-                # Prepare data for chart
-                chart_data = pd.DataFrame({
-                    'date': [datetime.now() - timedelta(hours=len(price_data) - i) for i in range(len(price_data))],
-                    'price': price_data
-                })
-                
-                # Remove null values
-                chart_data = chart_data[chart_data['price'] > 0]
+                price_series = product_info['price_series']
+                chart = build_price_chart(asin, str(price_series.times[-1]), price_series)
                 
-                # Create Altair chart with pink theme
-                chart = alt.Chart(chart_data).mark_line(
-                    color='#FF69B4',
-                    point=alt.OverlayMarkDef(color="#FF1493")
-                ).encode(
-                    x=alt.X('date:T', title='Date'),
-                    y=alt.Y('price:Q', title='Price ($)', scale=alt.Scale(zero=False)),
-                    tooltip=['date:T', 'price:Q']
-                ).properties(
-                    height=300
-                ).interactive()
-                
-                st.altair_chart(chart, use_container_width=True)
+                with span('chart_render'):
+                    st.altair_chart(chart, use_container_width=True)
                 
                 # Display price metrics
                 st.markdown("### 💰 Price Analysis")
@@ -214,101 +329,69 @@ if amazon_url:
                     delta_text = f"{delta:.2f}" if delta < 0 else f"+{delta:.2f}"
                     st.metric("Lowest Price", f"${lowest_price:.2f}", delta=delta_text)
                 
+                deal = product_info.get('deal')
+                if deal:
+                    low_text = "at its all-time low" if deal['at_low'] else f"last at its low {deal['days_since_low']:.0f} days ago"
+                    drop_text = "" if deal['drop_probability'] is None else f" · {deal['drop_probability']:.0%} chance it drops within a month"
+                    st.caption(
+                        f"Usually ${deal['typical_price']:.2f} · cheaper than now {deal['cheaper_share']:.0f}% of the past "
+                        f"{deal['days_analyzed']} days · {low_text}{drop_text}"
+                    )
+                
                 # Girl Math calculation
-                savings, percent = girl_math_logic(current_price, peak_price, lowest_price)
+                savings, percent = girl_math_logic(current_price, peak_price, lowest_price, deal)
                 
                 # Display Girl Math results
                 st.markdown("### ✨ Girl Math Results")
                 
-                # Create a styled box for the Girl Math results
-                st.markdown(f"""
-                <div style="background-color: #FFD1DC; padding: 20px; border-radius: 15px; margin: 10px 0; text-align: center; box-shadow: 0px 4px 12px rgba(255, 105, 180, 0.2);">
-                    <h3 style="font-family: 'Pacifico', cursive; color: #FF1493; margin-bottom: 15px;">By Girl Math Logic...</h3>
-                    <p style="font-family: 'Quicksand', sans-serif; font-size: 18px; color: #FF1493;">
-                        You're <b>saving ${savings:.2f}</b> ({percent:.1f}% off peak price)!
-                    </p>
-                    <p style="font-family: 'Quicksand', sans-serif; font-size: 16px; color: #FF1493; margin-top: 10px;">
-                        {girl_math_statement(current_price, peak_price, lowest_price)}
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(
+                    girl_math_box(savings, percent, girl_math_statement(current_price, peak_price, lowest_price, deal)),
+                    unsafe_allow_html=True,
+                )
                 
-                # Check Walmart price
-                st.markdown("### 🛒 Compare with Walmart")
+                # Compare with the other stores, searched in the background since we knew the title
+                st.markdown("### 🛒 Compare with other stores")
                 
-                with st.spinner("Checking Walmart prices..."):
-                    walmart_price_str = search_walmart(product_title)
+                with st.spinner("Checking other stores..."):
+                    store_results = collect_store_results(store_futures, min_results=STORE_MIN_RESULTS, timeout=STORE_TIMEOUT)
                     
-                    if walmart_price_str:
-                        try:
-                            # Extract numeric price from string
-                            walmart_price_match = re.search(r'(\d+\.\d+)', walmart_price_str)
-                            if walmart_price_match:
-                                walmart_price = float(walmart_price_match.group(1))
-                                
-                                # Compare prices
-                                price_diff = current_price - walmart_price
-                                
-                                if price_diff > 0:
-                                    st.markdown(f"""
-                                    <div style="background-color: #FFD1DC; padding: 15px; border-radius: 15px; margin: 10px 0;">
-                                        <p style="font-family: 'Quicksand', sans-serif; color: #FF1493;">
-                                            Walmart price: <b>${walmart_price:.2f}</b> (You'd save <b>${price_diff:.2f}</b> shopping at Walmart!)
-                                        </p>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                elif price_diff < 0:
-                                    st.markdown(f"""
-                                    <div style="background-color: #FFD1DC; padding: 15px; border-radius: 15px; margin: 10px 0;">
-                                        <p style="font-family: 'Quicksand', sans-serif; color: #FF1493;">
-                                            Walmart price: <b>${walmart_price:.2f}</b> (Amazon is <b>${abs(price_diff):.2f}</b> cheaper!)
-                                        </p>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                else:
-                                    st.markdown(f"""
-                                    <div style="background-color: #FFD1DC; padding: 15px; border-radius: 15px; margin: 10px 0;">
-                                        <p style="font-family: 'Quicksand', sans-serif; color: #FF1493;">
-                                            Walmart price: <b>${walmart_price:.2f}</b> (Same as Amazon!)
-                                        </p>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                            else:
-                                st.markdown(f"""
-                                <div style="background-color: #FFD1DC; padding: 15px; border-radius: 15px; margin: 10px 0;">
-                                    <p style="font-family: 'Quicksand', sans-serif; color: #FF1493;">
-                                        Walmart price: <b>{walmart_price_str}</b>
-                                    </p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                        except:
-                            st.markdown(f"""
-                            <div style="background-color: #FFD1DC; padding: 15px; border-radius: 15px; margin: 10px 0;">
-                                <p style="font-family: 'Quicksand', sans-serif; color: #FF1493;">
-                                    Walmart price: <b>{walmart_price_str}</b>
-                                </p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    else:
-                        st.markdown("""
-                        <div style="background-color: #FFD1DC; padding: 15px; border-radius: 15px; margin: 10px 0;">
-                            <p style="font-family: 'Quicksand', sans-serif; color: #FF1493;">
-                                Couldn't find this product on Walmart 😔
-                            </p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    st.markdown(
+                        ''.join(
+                            store_card(STORES[store_name].display_name, store_result, current_price)
+                            for store_name, store_result in store_results.items()
+                        ),
+                        unsafe_allow_html=True,
+                    )
                 
                 # Show buy button
                 st.markdown("### 💝 Ready to buy?")
                 
-                col_buy1, col_buy2, _ = st.columns([1, 1, 2])
-                with col_buy1:
-                    st.markdown(f"<a href='{amazon_url}' target='_blank'><button style='background-color: #FF69B4; color: white; padding: 10px 20px; border: none; border-radius: 20px; cursor: pointer; font-family: \"Quicksand\", sans-serif; width: 100%;'>Buy on Amazon</button></a>", unsafe_allow_html=True)
+                found_stores = [result for result in store_results.values() if isinstance(result, dict)]
+                buy_columns = st.columns(len(found_stores) + 2)
+                with buy_columns[0]:
+                    st.markdown(link_button(amazon_url, "Buy on Amazon"), unsafe_allow_html=True)
+                
+                for buy_column, store_result in zip(buy_columns[1:], found_stores):
+                    with buy_column:
+                        st.markdown(
+                            link_button(store_result['url'], f"Check on {store_result['display_name']}", secondary=True),
+                            unsafe_allow_html=True,
+                        )
+                
+                # Let the background watcher keep an eye on the price
+                st.markdown("### 👀 Watch this price")
                 
-                with col_buy2:
-                    if walmart_price_str:
-                        walmart_search_url = f"https://www.walmart.com/search?q={product_title.replace(' ', '+')}"
-                        st.markdown(f"<a href='{walmart_search_url}' target='_blank'><button style='background-color: #FFD1DC; color: #FF1493; padding: 10px 20px; border: 2px solid #FF69B4; border-radius: 20px; cursor: pointer; font-family: \"Quicksand\", sans-serif; width: 100%;'>Check on Walmart</button></a>", unsafe_allow_html=True)
+                col_watch1, col_watch2, _ = st.columns([1, 1, 2])
+                with col_watch1:
+                    watch_threshold = st.number_input(
+                        "Tell me when it drops to ($)", min_value=0.0, value=round(current_price * 0.9, 2), step=1.0
+                    )
+                with col_watch2:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    if st.button("👀 Watch it"):
+                        get_watchlist().set_keepa_key(owner, keepa_api_key)
+                        get_watchlist().add(asin, threshold=watch_threshold, title=product_title, current_price=current_price, owner=owner)
+                        st.success(f"Watching! We'll shout when it hits ${watch_threshold:.2f} or a new all-time low 💖")
                 
                 # Add to search history
                 if asin not in [item['asin'] for item in st.session_state.search_history]:
@@ -325,28 +408,75 @@ if amazon_url:
     else:
         st.error("Couldn't find ASIN. Please check the link and make sure it's a valid Amazon product URL.")
 
+# Process a pasted wishlist in as few Keepa calls as possible
+if wishlist_text:
+    # Anything goes here: one link per line, an email digest, a spreadsheet column
+    wishlist_asins = cached_extract_asins(wishlist_text)
+    
+    st.markdown("### 🛍️ Wishlist Girl Math")
+    if not wishlist_asins:
+        st.warning("Couldn't find any Amazon product links in your wishlist")
+    
+    if not keepa_api_key:
+        st.error("Please enter your Keepa API Key in the sidebar to continue")
+    elif wishlist_asins:
+        api = get_keepa_client(keepa_api_key)
+        wishlist_rows = []
+        wishlist_table = st.empty()
+        
+        with st.spinner("💖 Applying Girl Math magic to your whole wishlist..."):
+            # Results come back a chunk at a time, so refresh the table as they arrive
+            try:
+                for asin, info in get_lookup_service().products_info(api, wishlist_asins, user=user_id):
+                    if info:
+                        savings, percent = girl_math_logic(info['current_price'], info['peak_price'], info['lowest_price'], info.get('deal'))
+                        wishlist_rows.append({
+                            'ASIN': asin,
+                            'Title': info['title'],
+                            'Current Price': info['current_price'],
+                            'Peak Price': info['peak_price'],
+                            'Lowest Price': info['lowest_price'],
+                            'Girl Math Savings': savings,
+                            '% Off Usual Price': percent,
+                        })
+                    else:
+                        wishlist_rows.append({'ASIN': asin, 'Title': "Couldn't retrieve product information"})
+                    wishlist_table.dataframe(wishlist_rows, use_container_width=True)
+            except KeepaBudgetExceeded as e:
+                st.warning(f"So many shoppers right now! The rest of your wishlist can go in {e.retry_after:.0f} seconds 💕")
+
 # Display search history
 if st.session_state.search_history:
     st.markdown("---")
     st.markdown("### 📚 Your Search History")
     
-    history_df = pd.DataFrame(st.session_state.search_history)
-    
-    for idx, item in enumerate(st.session_state.search_history):
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.markdown(f"""
-            <div style="background-color: white; padding: 10px; border-radius: 10px; margin: 5px 0; border-left: 4px solid #FF69B4;">
-                <p style="font-family: 'Quicksand', sans-serif; color: #FF1493; margin: 0; font-size: 15px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; max-width: 400px;">
-                    {item['title']}
-                </p>
-                <p style="font-family: 'Quicksand', sans-serif; color: #FF69B4; margin: 0; font-size: 14px;">
-                    Current price: <b>${item['current_price']:.2f}</b>
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-        with col2:
-            st.markdown(f"<a href='{item['url']}' target='_blank'><button style='background-color: #FFD1DC; color: #FF1493; padding: 5px 10px; border: 1px solid #FF69B4; border-radius: 10px; cursor: pointer; font-family: \"Quicksand\", sans-serif; font-size: 12px; width: 100%;'>View Item</button></a>", unsafe_allow_html=True)
+    # One table per page instead of a row of widgets per item, so reruns
+    # don't slow down as the history grows
+    history = st.session_state.search_history
+    pages = history_pages(history)
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1) if pages > 1 else 1
+    st.markdown(history_table(history, page), unsafe_allow_html=True)
+
+# Debug panel: where the time went on this rerun, plus process-wide counters
+if show_timings:
+    with st.sidebar:
+        st.markdown("---")
+        st.markdown("## 🐞 Stage timings")
+        if rerun_spans:
+            timings = [{'stage': stage, 'ms': seconds * 1000} for stage, seconds in rerun_spans]
+            st.dataframe(timings, hide_index=True, use_container_width=True)
+        else:
+            st.markdown("Nothing ran on this rerun, everything came from the cache ✨")
+        
+        snapshot = registry.snapshot()
+        st.markdown("**Counters**")
+        for (name, labels), value in sorted(snapshot['counters'].items()):
+            label_text = ', '.join(f"{k}={v}" for k, v in labels)
+            st.markdown(f"- {name} ({label_text}): {value}" if label_text else f"- {name}: {value}")
+        for (name, labels), value in sorted(snapshot['gauges'].items()):
+            st.markdown(f"- {name}: {value}")
+        with st.expander("OpenMetrics"):
+            st.code(render_openmetrics(), language="text")
 
 # Footer
 st.markdown("""
@@ -355,23 +485,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-def girl_math_statement(current_price, peak_price, lowest_price):
-    """Generate a fun girl math statement based on the price situation"""
-    statements = [
-        f"That's like getting paid ${peak_price - current_price:.2f} to shop!",
-        "Remember, if it's on sale, it's basically saving money!",
-        "If you use it 10 times, it's only $" + f"{current_price/10:.2f}" + " per use!",
-        "That's only " + f"{current_price/30:.2f}" + " per day for a month!",
-        "Buy now, your future self will thank you!",
-        "It's an investment in your happiness!",
-        "If you return something else, this is basically free!",
-        "You've already saved money by not buying it at the peak price!"
-    ]
-    
-    if current_price <= lowest_price * 1.1:
-        return "This is literally the LOWEST price! It would be irresponsible NOT to buy it!"
-    elif current_price <= peak_price * 0.8:
-        return "That's a MAJOR discount! It's like they're paying you to take it!"
-    else:
-        import random
-        return random.choice(statements)
+# Keep polling watched products in the background, on a changed key if the
+# user entered a new one. Started last so it never delays the page
+if keepa_api_key and watch_count and watchlist.keepa_key(owner) != keepa_api_key:
+    watchlist.set_keepa_key(owner, keepa_api_key)
+get_watch_scheduler()
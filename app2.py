@@ -1,12 +1,9 @@
-import requests
 from bs4 import BeautifulSoup
+from scraper import get_scraper_client
 
 def search_amazon(product_name):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36"
-    }
     search_url = f"https://www.amazon.com/s?k={product_name.replace(' ', '+')}"
-    response = requests.get(search_url, headers=headers)
+    response = get_scraper_client().get(search_url)
     
     if response.status_code == 200:
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -21,10 +18,11 @@ def search_amazon(product_name):
     else:
         return None
 
-# Example usage
-product_name = "wireless earbuds"
-amazon_product_url = search_amazon(product_name)
-if amazon_product_url:
-    print(f"Found product URL: {amazon_product_url}")
-else:
-    print("Product not found on Amazon.")
\ No newline at end of file
+if __name__ == "__main__":
+    # Example usage
+    product_name = "wireless earbuds"
+    amazon_product_url = search_amazon(product_name)
+    if amazon_product_url:
+        print(f"Found product URL: {amazon_product_url}")
+    else:
+        print("Product not found on Amazon.")
@@ -0,0 +1,54 @@
+"""Compare HTML parser backends on Walmart search pages
+
+    python benchmarks/bench_parsers.py
+    python benchmarks/bench_parsers.py --page saved_search.html --repeat 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from parsers import available_backends, parse_walmart_price, select_first_text, WALMART_PRICE_SELECTORS  # noqa: E402
+from benchmarks.fixtures import walmart_search_page  # noqa: E402
+
+
+def time_it(func, repeat):
+    """Return (best, mean) seconds per call over repeat calls"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page', action='append', help="saved Walmart search page to benchmark (repeatable)")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.page:
+        pages = {os.path.basename(path): open(path, encoding='utf-8').read() for path in args.page}
+    else:
+        pages = {
+            'with __NEXT_DATA__': walmart_search_page(next_data=True),
+            'html only': walmart_search_page(next_data=False),
+        }
+
+    print(f"{'page':<22}{'size':>9}  {'method':<22}{'best ms':>9}{'mean ms':>9}  result")
+    for name, html in pages.items():
+        size = f"{len(html) // 1024} KB"
+        cases = [('__NEXT_DATA__ + css', lambda: parse_walmart_price(html))]
+        for backend in available_backends():
+            cases.append((f'css ({backend})', lambda b=backend: select_first_text(html, WALMART_PRICE_SELECTORS, b)))
+
+        for method, func in cases:
+            best, mean = time_it(func, args.repeat)
+            print(f"{name:<22}{size:>9}  {method:<22}{best * 1000:>9.2f}{mean * 1000:>9.2f}  {func()!r}")
+
+
+if __name__ == '__main__':
+    main()
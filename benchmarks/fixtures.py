@@ -0,0 +1,154 @@
+"""Synthetic, deterministic pages and API responses for the benchmarks
+
+Nothing here touches the network. The pages mimic the shape and size of
+real search results (a few hundred KB, mostly markup noise) closely enough
+to exercise the parsers the way production traffic does.
+"""
+import json
+import random
+
+WALMART_PRODUCTS = [
+    ("Pink Fluffy Slippers Women's Size 8", 12.97),
+    ("Stanley Quencher H2.0 Tumbler 40 oz Rose Quartz", 45.00),
+    ("Ninja Professional Blender 1000W", 89.99),
+    ("Apple AirPods Pro (2nd Generation)", 1299.00),
+]
+
+
+def _noise(rng, blocks):
+    """Markup that every search page carries: nav, filters, tracking, ads"""
+    parts = []
+    for i in range(blocks):
+        parts.append(
+            f'<div class="flex items-center ph3 w-{rng.randint(10, 99)}" data-testid="filter-{i}">'
+            f'<a href="/browse/{rng.randint(1000, 9999)}?povid=nav_{i}" class="lh-copy">'
+            f'Category {i}</a><span class="gray f7">({rng.randint(1, 900)})</span></div>'
+        )
+    return '\n'.join(parts)
+
+
+def walmart_search_page(items=40, noise_blocks=1500, next_data=True, seed=0):
+    """Return a Walmart-like search results page as a string"""
+    rng = random.Random(seed)
+    products = [WALMART_PRODUCTS[i % len(WALMART_PRODUCTS)] for i in range(items)]
+
+    tiles = []
+    for i, (name, price) in enumerate(products):
+        tiles.append(
+            f'<div class="mb0 ph1 pa0-xl bb b--near-white w-25" data-item-id="{1000 + i}">'
+            f'<a href="/ip/{name.replace(" ", "-")}/{1000 + i}"><span data-automation-id="product-title">{name}</span></a>'
+            f'<div class="flex flex-wrap justify-start items-center lh-title mb1">'
+            f'<span data-automation-id="product-price"><span class="w_iUH7">current price ${price:,.2f}</span>'
+            f'<div class="mr1 mr2-xl b black lh-copy f5 f4-l">${price:,.2f}</div></span></div></div>'
+        )
+
+    script = ''
+    if next_data:
+        data = {'props': {'pageProps': {'initialData': {'searchResult': {'itemStacks': [{'items': [
+            {
+                '__typename': 'Product',
+                'name': name,
+                'usItemId': str(1000 + i),
+                'canonicalUrl': f'/ip/{name.replace(" ", "-")}/{1000 + i}',
+                'price': price,
+                'priceInfo': {
+                    'linePrice': f'${price:,.2f}',
+                    'currentPrice': {'price': price, 'priceString': f'${price:,.2f}'},
+                },
+            }
+            for i, (name, price) in enumerate(products)
+        ]}]}}}}}
+        script = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script>'
+
+    return (
+        '<!DOCTYPE html><html lang="en"><head><title>Walmart.com</title></head><body>'
+        f'<header>{_noise(rng, noise_blocks // 2)}</header>'
+        f'<main><section>{"".join(tiles)}</section></main>'
+        f'<footer>{_noise(rng, noise_blocks // 2)}</footer>'
+        f'{script}</body></html>'
+    )
+
+
+
+def _store_page(title, tile, items, noise_blocks, seed):
+    rng = random.Random(seed)
+    tiles = ''.join(tile(name, price) for name, price in
+                    (WALMART_PRODUCTS[i % len(WALMART_PRODUCTS)] for i in range(items)))
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><title>{title}</title></head><body>'
+        f'<header>{_noise(rng, noise_blocks // 2)}</header>'
+        f'<main><section>{tiles}</section></main>'
+        f'<footer>{_noise(rng, noise_blocks // 2)}</footer></body></html>'
+    )
+
+
+def target_search_page(items=24, noise_blocks=1500, seed=1):
+    """Return a Target-like search results page as a string"""
+    return _store_page('Target', lambda name, price: (
+        f'<div data-test="@web/site-top-of-funnel/ProductCardWrapper"><a data-test="product-title" href="/p/{name.replace(" ", "-")}">{name}</a>'
+        f'<div><span data-test="current-price"><span>${price:,.2f}</span></span></div></div>'
+    ), items, noise_blocks, seed)
+
+
+def bestbuy_search_page(items=24, noise_blocks=1500, seed=2):
+    """Return a Best Buy-like search results page as a string"""
+    return _store_page('Best Buy', lambda name, price: (
+        f'<li class="sku-item"><h4 class="sku-title"><a href="/site/{name.replace(" ", "-")}.p">{name}</a></h4>'
+        f'<div class="priceView-hero-price priceView-customer-price">'
+        f'<span aria-hidden="true">${price:,.2f}</span><span class="sr-only">Your price ${price:,.2f}</span></div></li>'
+    ), items, noise_blocks, seed)
+
+
+AMAZON_URLS = [
+    "https://www.amazon.com/dp/B0BDHWDR12",
+    "https://www.amazon.com/Apple-Generation-Cancelling-Transparency-Personalized/dp/B0CHWRXH8B/ref=sr_1_1?crid=2ZQ&keywords=airpods&qid=1700000000&sprefix=airpo%2Caps%2C150&sr=8-1&th=1",
+    "https://www.amazon.com/gp/product/B07FZ8S74R?pf_rd_r=ABCDEF&pf_rd_p=12345&pd_rd_wg=xyz&pd_rd_i=B07FZ8S74R&psc=1",
+    "https://www.amazon.com/Stanley-Quencher-Tumbler-Stainless-Insulated/dp/B0CJZMP7L1?ref_=ast_sto_dp&th=1&psc=1",
+    "https://smile.amazon.com/ASIN/B00X4WHP5E/",
+]
+
+
+def keepa_product(asin='B0BDHWDR12', points=1000, seed=0, title="Pink Fluffy Slippers Women's Size 8"):
+    """Return a Keepa-shaped product (as keepa.Keepa.query gives it) with a NEW history
+
+    Like keepa's parsed responses, prices are dollar floats with
+    out-of-stock gaps (NaN) and times are datetime.datetime objects;
+    timestamps are irregular and a few hours apart.
+    """
+    from datetime import datetime
+
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(30, 6 * 60, size=points).astype('timedelta64[m]')
+    times = np.datetime64('2015-01-01T00:00') + np.cumsum(steps)
+    prices = np.round(3000 + np.cumsum(rng.normal(0, 40, size=points))).clip(500, None) / 100
+    prices[rng.random(points) < 0.03] = np.nan
+    return {
+        'asin': asin,
+        'title': title,
+        'data': {'NEW': prices, 'NEW_time': times.astype(datetime)},
+    }
+
+
+class FakeKeepa:
+    """Stands in for keepa.Keepa, answering queries from generated products
+
+    Products are generated once per ASIN so that benchmarks time our code,
+    not the fixture generator.
+    """
+
+    def __init__(self, points=1000):
+        self.points = points
+        self.tokens_left = 1000000
+        self.queries = 0
+        self._products = {}
+
+    def query(self, items, domain='US', **kwargs):
+        self.queries += 1
+        if isinstance(items, str):
+            items = [items]
+        for asin in items:
+            if asin not in self._products:
+                self._products[asin] = keepa_product(asin, self.points, seed=len(self._products))
+        return [self._products[asin] for asin in items]
@@ -0,0 +1,104 @@
+"""Check the Streamlit app's startup import cost against a budget
+
+Imports exactly what app.py imports at module level, in fresh interpreters
+under `python -X importtime`, and fails if our own modules take longer than
+the budget or pull in a dependency that should only load on first use.
+Streamlit's own import time is reported but not budgeted.
+
+    python benchmarks/importtime.py                   # exit 1 if over budget
+    python benchmarks/importtime.py --budget-ms 80 --top 20
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_PATH = os.path.join(ROOT, 'app.py')
+
+# Import time of app.py's own modules (everything but Streamlit), in ms
+DEFAULT_BUDGET_MS = 60
+# These must only load once a product is looked up
+LAZY_MODULES = ('keepa', 'altair', 'pandas', 'numpy', 'matplotlib', 'requests', 'bs4', 'lxml', 'selectolax')
+BASELINE_MODULES = ('streamlit',)
+
+
+def startup_imports(path=APP_PATH):
+    """Return the module-level import statements of a script as source lines"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def run_importtime(statements):
+    """Run the imports in a fresh interpreter; return (importtime rows, loaded modules)"""
+    # sys is always loaded, so reporting sys.modules adds nothing to the timings
+    code = '\n'.join(statements + ['import sys', "print('\\n'.join(sys.modules))"])
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows, set(result.stdout.split())
+
+
+def measure(statements, repeat):
+    """Median top-level cumulative import time per module, in ms, over repeat runs
+
+    Modules the bare interpreter loads before running any code (site,
+    encodings, ...) are left out.
+    """
+    interpreter = {name for name, _, _, _ in run_importtime([])[0]}
+    runs = []
+    loaded = set()
+    for _ in range(repeat):
+        rows, loaded = run_importtime(statements)
+        # Depth 0 is relative to the least-indented row; every module is
+        # counted once, under whoever imported it first
+        rows = [row for row in rows if row[0] not in interpreter]
+        top = min(depth for _, depth, _, _ in rows)
+        runs.append({name: cumulative / 1000 for name, depth, _, cumulative in rows if depth == top})
+    names = set().union(*runs)
+    return {name: statistics.median(run.get(name, 0.0) for run in runs) for name in names}, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="show this many of the slowest imports")
+    args = parser.parse_args(argv)
+
+    statements = startup_imports()
+    timings, loaded = measure(statements, args.repeat)
+
+    baseline = sum(ms for name, ms in timings.items() if name.split('.')[0] in BASELINE_MODULES)
+    ours = sum(ms for name, ms in timings.items() if name.split('.')[0] not in BASELINE_MODULES)
+
+    print(f"{'module':<40}{'cumulative ms':>15}")
+    for name, ms in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<40}{ms:>15.1f}")
+    print(f"\nstreamlit: {baseline:.1f} ms (not budgeted)")
+    print(f"app modules: {ours:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if ours > args.budget_ms:
+        print(f"OVER BUDGET by {ours - args.budget_ms:.1f} ms")
+        failed = True
+    eager = sorted(m for m in LAZY_MODULES if m in loaded)
+    if eager:
+        print(f"Loaded at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
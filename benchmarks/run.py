@@ -0,0 +1,219 @@
+"""Benchmark the lookup hot paths without touching the network
+
+Keepa is answered by benchmarks.fixtures.FakeKeepa and store pages are
+served by a local HTTP server, so runs are repeatable anywhere.
+
+    python benchmarks/run.py                          # run everything
+    python benchmarks/run.py -k walmart --repeat 50   # only matching cases
+    python benchmarks/run.py --save baseline.json
+    python benchmarks/run.py --compare baseline.json  # exit 1 on regressions
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from requests.adapters import HTTPAdapter  # noqa: E402
+
+import scraper  # noqa: E402
+from matching import rank_candidates  # noqa: E402
+from parsers import parse_walmart_candidates  # noqa: E402
+from analytics import deal_stats  # noqa: E402
+from prices import parse_cents, parse_price  # noqa: E402
+from stores import STORES, compare_stores  # noqa: E402
+from price_series import DEFAULT_CHART_POINTS  # noqa: E402
+from benchmarks.fixtures import AMAZON_URLS, FakeKeepa, bestbuy_search_page, target_search_page, walmart_search_page  # noqa: E402
+from utils import extract_asin, extract_asins, get_amazon_product_info, get_amazon_products_info, search_walmart  # noqa: E402
+
+# A case is slower than its baseline if its p50 grows by more than this factor
+DEFAULT_THRESHOLD = 1.25
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves saved store pages; the server's page_for(path, query) picks one"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        page = self.server.page_for(parts.path, parts.query)
+        body = (page or '').encode('utf-8')
+        self.send_response(200 if page else 404)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LocalAdapter(HTTPAdapter):
+    """Sends requests for real store hosts to the local fixture server"""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = f"{self.base_url}{parts.path}?{parts.query}"
+        return super().send(request, **kwargs)
+
+
+def start_fixture_server(page_for):
+    """Start the fixture server in a thread and return it with its base URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.page_for = page_for
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def measure(func, repeat, warmup=2):
+    """Time repeat calls of func, then measure peak memory of one more"""
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'p50_ms': cuts[49] * 1000,
+        'p90_ms': cuts[89] * 1000,
+        'p99_ms': cuts[98] * 1000,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'peak_kb': peak / 1024,
+    }
+
+
+def build_cases():
+    """Return {name: callable} for every benchmarked path"""
+    cases = {}
+
+    urls = AMAZON_URLS * 200
+    cases['extract_asin x1000'] = lambda: [extract_asin(url) for url in urls]
+    blob = '\n'.join(f"Deal of the day: {url} (ends soon!)" for url in urls)
+    cases['extract_asins 1000-link blob'] = lambda: extract_asins(blob)
+
+    for points in (200, 20000, 200000):
+        api = FakeKeepa(points)
+        cases[f'get_amazon_product_info {points} pts'] = lambda api=api: get_amazon_product_info(api, 'B0BDHWDR12')
+
+    for batch in (10, 100, 500):
+        api = FakeKeepa(1000)
+        asins = [f"B{i:09d}" for i in range(batch)]
+        cases[f'get_amazon_products_info batch {batch}'] = lambda api=api, asins=asins: list(get_amazon_products_info(api, asins))
+
+    for points in (200, 200000):
+        info = get_amazon_product_info(FakeKeepa(points), 'B0BDHWDR12')
+        cases[f'chart prep {points} pts'] = lambda info=info: chart_prep(info)
+        cases[f'deal_stats {points} pts'] = lambda info=info: deal_stats(info['price_series'])
+
+    candidates = parse_walmart_candidates(walmart_search_page(items=40))
+    title = "Apple AirPods Pro (2nd Generation) Wireless Ear Buds with USB-C Charging"
+    cases['rank_candidates 40 results'] = lambda: rank_candidates(title, candidates, brand='Apple')
+
+    price_texts = ['$1,299.00', 'current price $12.97$12.97', '$12.97 - $24.99', 'Now $5.98 ($0.25/oz)', '99¢']
+    cases['parse_price x1000'] = lambda: [parse_price(text) for text in price_texts * 200]
+    column = [f"${cents / 100:,.2f}" for cents in range(0, 10000000, 1000)] * 10
+    cases['parse_cents 100k column'] = lambda: parse_cents(column)
+
+    cases['search_walmart (__NEXT_DATA__)'] = lambda: search_walmart("Pink Fluffy Slippers next data")
+    cases['search_walmart (html only)'] = lambda: search_walmart("Pink Fluffy Slippers html only")
+    for name, adapter in STORES.items():
+        if name != 'walmart':
+            cases[f'search {name}'] = lambda adapter=adapter: adapter.search("Pink Fluffy Slippers")
+    cases['compare_stores (all)'] = lambda: compare_stores("Pink Fluffy Slippers next data")
+    cases['compare_stores (first 1)'] = lambda: compare_stores("Pink Fluffy Slippers next data", min_results=1)
+    return cases
+
+
+def chart_prep(product_info):
+    """What app.py does to turn product info into a chart spec"""
+    import altair as alt
+    chart_data = product_info['price_series'].downsample(DEFAULT_CHART_POINTS).to_frame()
+    return alt.Chart(chart_data).mark_line().encode(x='date:T', y='price:Q').to_dict()
+
+
+def install_fixture_pages():
+    """Point the scraper client at local copies of the store pages"""
+    with_json = walmart_search_page(next_data=True)
+    html_only = walmart_search_page(next_data=False)
+    target = target_search_page()
+    bestbuy = bestbuy_search_page()
+
+    def page_for(path, query):
+        if path == '/s':
+            return target
+        if path == '/site/searchpage.jsp':
+            return bestbuy
+        if path != '/search':
+            return None
+        return html_only if 'html+only' in query else with_json
+
+    server, base_url = start_fixture_server(page_for)
+    client = scraper.configure_scraper_client(rate=1e9, burst=1e9, retries=0)
+    for host in ('https://www.walmart.com', 'https://www.target.com', 'https://www.bestbuy.com'):
+        client.session.mount(host, LocalAdapter(base_url))
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='keyword', help="only run cases whose name contains this")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--save', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="baseline JSON from --save; exit 1 if any p50 regressed")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    server = install_fixture_pages()
+    try:
+        results = {}
+        print(f"{'case':<40}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KB':>11}")
+        for name, func in build_cases().items():
+            if args.keyword and args.keyword not in name:
+                continue
+            results[name] = stats = measure(func, args.repeat)
+            print(f"{name:<40}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['peak_kb']:>11.0f}")
+    finally:
+        server.shutdown()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = [
+            (name, baseline[name]['p50_ms'], stats['p50_ms'])
+            for name, stats in results.items()
+            if name in baseline and stats['p50_ms'] > baseline[name]['p50_ms'] * args.threshold
+        ]
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p50 {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
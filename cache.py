@@ -0,0 +1,189 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Keepa price history moves slowly, a few hours of staleness is fine
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_CACHE_PATH = os.environ.get("GIRL_MATH_CACHE_PATH", ".girl_math_cache.sqlite")
+# A hit only rewrites accessed_at once it's this stale (seconds), so most
+# hits don't write to disk. LRU order is exact to within this much.
+ACCESS_UPDATE_INTERVAL = 60
+
+
+def _cache_key(asin, domain):
+    """Normalize an (asin, domain) pair so lookups are case-insensitive"""
+    return asin.strip().upper(), domain.strip().upper()
+
+
+class MemoryProductCache:
+    """In-memory product cache with a TTL and LRU eviction"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, asin, domain='US'):
+        """Return the cached product info, or None if missing or expired"""
+        key = _cache_key(asin, domain)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            stored_at, value = entry
+            if self.ttl is not None and self.clock() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+
+            # Mark as most recently used
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, asin, value, domain='US'):
+        """Store product info, evicting the least recently used entries"""
+        key = _cache_key(asin, domain)
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, asin, domain='US'):
+        """Drop a single product from the cache"""
+        with self._lock:
+            self._entries.pop(_cache_key(asin, domain), None)
+
+    def clear(self):
+        """Drop every cached product"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteProductCache:
+    """On-disk product cache backed by SQLite, so hits survive restarts"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+
+        # Streamlit runs each session in its own thread, so share one
+        # connection and serialize access with a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS product_cache (
+                asin TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (asin, domain)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS product_cache_accessed ON product_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, asin, domain='US'):
+        """Return the cached product info, or None if missing or expired"""
+        asin, domain = _cache_key(asin, domain)
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, accessed_at, payload FROM product_cache WHERE asin = ? AND domain = ?",
+                (asin, domain),
+            ).fetchone()
+            if row is None:
+                return None
+
+            stored_at, accessed_at, payload = row
+            if self.ttl is not None and now - stored_at > self.ttl:
+                self._conn.execute(
+                    "DELETE FROM product_cache WHERE asin = ? AND domain = ?", (asin, domain)
+                )
+                self._conn.commit()
+                return None
+
+            if now - accessed_at > ACCESS_UPDATE_INTERVAL:
+                self._conn.execute(
+                    "UPDATE product_cache SET accessed_at = ? WHERE asin = ? AND domain = ?",
+                    (now, asin, domain),
+                )
+                self._conn.commit()
+
+        try:
+            return pickle.loads(payload)
+        except Exception as e:
+            print(f"Error reading cached product: {str(e)}")
+            self.invalidate(asin, domain)
+            return None
+
+    def set(self, asin, value, domain='US'):
+        """Store product info, evicting the least recently used entries"""
+        asin, domain = _cache_key(asin, domain)
+        now = self.clock()
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO product_cache (asin, domain, stored_at, accessed_at, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (asin, domain, now, now, payload),
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM product_cache WHERE rowid IN ("
+                    "SELECT rowid FROM product_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def invalidate(self, asin, domain='US'):
+        """Drop a single product from the cache"""
+        asin, domain = _cache_key(asin, domain)
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM product_cache WHERE asin = ? AND domain = ?", (asin, domain)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Drop every cached product"""
+        with self._lock:
+            self._conn.execute("DELETE FROM product_cache")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM product_cache").fetchone()[0]
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_product_cache(path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+    """Return the process-wide product cache, creating it on first use
+
+    An empty path gives an in-memory cache instead of an SQLite file.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            if path:
+                _default_cache = SQLiteProductCache(path, ttl=ttl, max_entries=max_entries)
+            else:
+                _default_cache = MemoryProductCache(ttl=ttl, max_entries=max_entries)
+        return _default_cache
@@ -0,0 +1,215 @@
+"""Headless deal scoring: girl-math without the browser
+
+Reads Amazon links (or short links) and bare ASINs from a file or stdin, looks
+them up on Keepa in batches, checks Walmart for each in a worker pool and
+streams Girl Math results out as JSONL or CSV.
+
+    python cli.py wishlist.txt --format csv --output deals.csv --checkpoint deals.done
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import keepa
+
+from cache import get_product_cache, DEFAULT_CACHE_PATH
+from stores import StoreSearchError
+from utils import extract_asins, get_amazon_products_info, search_walmart, girl_math_logic
+
+OUTPUT_FIELDS = [
+    'asin', 'title', 'current_price', 'peak_price', 'lowest_price',
+    'girl_math_savings', 'girl_math_percent', 'walmart_price', 'error',
+]
+
+BARE_ASIN = re.compile(r'^[A-Z0-9]{10}$')
+
+
+def read_asins(lines):
+    """Turn input lines into ASINs, skipping blanks and # comments
+
+    A line may be a bare ASIN or any text holding Amazon links (several
+    per line is fine, e.g. a CSV export). Yields (line, asin) pairs; asin
+    is None when nothing could be extracted from the line.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if BARE_ASIN.match(line.upper()):
+            yield line, line.upper()
+            continue
+        asins = extract_asins(line)
+        if not asins:
+            yield line, None
+        for asin in asins:
+            yield line, asin
+
+
+def load_checkpoint(path):
+    """Return the set of ASINs already written by an earlier run"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def walmart_price(product_info):
+    """Walmart's price for the product, or None if it has none or couldn't be searched"""
+    try:
+        return search_walmart(product_info['title'], **product_info.get('identifiers', {}))
+    except StoreSearchError as e:
+        print(f"Error searching Walmart: {str(e)}", file=sys.stderr)
+        return None
+
+
+def score_product(asin, product_info, check_walmart=True):
+    """Build one output row from Keepa product info"""
+    if product_info is None:
+        return {'asin': asin, 'error': "Couldn't retrieve product information"}
+
+    current_price = product_info['current_price']
+    peak_price = product_info['peak_price']
+    lowest_price = product_info['lowest_price']
+    savings, percent = girl_math_logic(current_price, peak_price, lowest_price, product_info.get('deal'))
+
+    return {
+        'asin': asin,
+        'title': product_info['title'],
+        'current_price': current_price,
+        'peak_price': peak_price,
+        'lowest_price': lowest_price,
+        'girl_math_savings': round(savings, 2),
+        'girl_math_percent': round(percent, 1),
+        'walmart_price': walmart_price(product_info) if check_walmart else None,
+    }
+
+
+class ResultWriter:
+    """Streams rows out as JSONL or CSV, flushing after each one"""
+
+    def __init__(self, stream, fmt='jsonl', write_header=True):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=OUTPUT_FIELDS, extrasaction='ignore')
+            if write_header:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self._csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(row) + '\n')
+        self.stream.flush()
+
+
+def run(lines, api, writer, workers=8, checkpoint=None, check_walmart=True, cache=None, log=sys.stderr):
+    """Score every ASIN in lines, writing rows as they finish
+
+    Returns a stats dict with counts and throughput.
+    """
+    started = time.monotonic()
+    done = load_checkpoint(checkpoint)
+    stats = {'scored': 0, 'failed': 0, 'skipped': 0, 'invalid': 0}
+
+    asins = []
+    for line, asin in read_asins(lines):
+        if asin is None:
+            stats['invalid'] += 1
+            print(f"No ASIN found in: {line}", file=log)
+        elif asin in done:
+            stats['skipped'] += 1
+        else:
+            asins.append(asin)
+
+    checkpoint_file = open(checkpoint, 'a') if checkpoint else None
+
+    def emit(future):
+        row = future.result()
+        writer.write(row)
+        stats['failed' if row.get('error') else 'scored'] += 1
+        # Failures (often a transient Keepa error on a whole chunk) stay out
+        # of the checkpoint so a resumed run retries them
+        if checkpoint_file and not row.get('error'):
+            checkpoint_file.write(row['asin'] + '\n')
+            checkpoint_file.flush()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Keepa is queried in batches on this thread while Walmart lookups
+            # for earlier batches run in the pool; finished rows are written
+            # as soon as they're ready
+            pending = set()
+            for asin, info in get_amazon_products_info(api, asins, cache=cache):
+                pending.add(pool.submit(score_product, asin, info, check_walmart))
+                finished, pending = wait(pending, timeout=0)
+                for future in finished:
+                    emit(future)
+            for future in as_completed(pending):
+                emit(future)
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    stats['elapsed'] = time.monotonic() - started
+    processed = stats['scored'] + stats['failed']
+    stats['per_second'] = processed / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    return stats
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='girl-math', description="Score Amazon deals with Girl Math, no browser required.")
+    parser.add_argument('input', nargs='?', default='-', help="file of Amazon links or ASINs, one per line (default: stdin)")
+    parser.add_argument('-o', '--output', default='-', help="where to write results (default: stdout)")
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], default='jsonl', help="output format (default: jsonl)")
+    parser.add_argument('-w', '--workers', type=int, default=8, help="parallel Walmart lookups (default: 8)")
+    parser.add_argument('--checkpoint', help="file of successfully scored ASINs; rerun with the same file to resume and retry failures")
+    parser.add_argument('--no-walmart', action='store_true', help="skip the Walmart price comparison")
+    parser.add_argument('--api-key', default=os.environ.get('KEEPA_API_KEY'), help="Keepa API key (default: $KEEPA_API_KEY)")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="product cache file, empty for in-memory (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.api_key:
+        print("A Keepa API key is required (--api-key or $KEEPA_API_KEY)", file=sys.stderr)
+        return 2
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    # When resuming into an existing file, append and don't repeat the CSV header
+    resuming = args.output != '-' and args.checkpoint and os.path.exists(args.output)
+    sink = sys.stdout if args.output == '-' else open(args.output, 'a' if resuming else 'w', newline='')
+
+    try:
+        stats = run(
+            source,
+            keepa.Keepa(args.api_key),
+            ResultWriter(sink, args.format, write_header=not resuming),
+            workers=args.workers,
+            checkpoint=args.checkpoint,
+            check_walmart=not args.no_walmart,
+            cache=get_product_cache(args.cache),
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(
+        f"Scored {stats['scored']}, failed {stats['failed']}, skipped {stats['skipped']} "
+        f"(checkpoint), invalid {stats['invalid']} in {stats['elapsed']:.1f}s "
+        f"({stats['per_second']:.1f} items/s)",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
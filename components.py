@@ -0,0 +1,265 @@
+"""HTML pieces the app renders with st.markdown(unsafe_allow_html=True)
+
+Templates are compiled once at import instead of rebuilt as f-strings on
+every rerun, styling lives in THEME_CSS classes rather than inline styles,
+and everything that comes from Amazon or a store page is escaped.
+markdown_escape does the same for text shown through plain Markdown.
+"""
+import re
+from html import escape
+from string import Template
+
+from prices import format_cents
+from stores import StoreSearchError, StoreTimeout
+
+# Search history rows shown per page
+HISTORY_PAGE_SIZE = 20
+
+# Everything Markdown (and Streamlit's $...$ LaTeX) gives a meaning to
+_MARKDOWN_SPECIAL_RE = re.compile(r'([\\`*_{}\[\]()<>#+\-.!|~$])')
+
+THEME_CSS = """
+<style>
+    /* Pink theme */
+    .main {
+        background-color: #fff0f5;
+    }
+    
+    /* Headers */
+    h1, h2, h3 {
+        font-family: 'Pacifico', cursive;
+        color: #FF69B4;
+    }
+    
+    /* General text */
+    p, div, label, span {
+        font-family: 'Quicksand', sans-serif;
+        color: #FF1493;
+    }
+    
+    /* Streamlit widgets customization */
+    .stButton button {
+        background-color: #FF69B4;
+        color: white;
+        border-radius: 20px;
+        border: none;
+        font-family: 'Quicksand', sans-serif;
+    }
+    
+    .stTextInput input {
+        border-radius: 20px;
+        border: 2px solid #FF69B4;
+    }
+    
+    /* Card-like containers */
+    .css-1r6slb0, .css-12oz5g7 {
+        background-color: white;
+        border-radius: 20px;
+        padding: 20px;
+        box-shadow: 0px 4px 12px rgba(255, 105, 180, 0.2);
+    }
+    
+    /* Success messages */
+    .element-container .stAlert {
+        background-color: #FFD1DC;
+        border: 1px solid #FF69B4;
+        border-radius: 20px;
+    }
+
+    /* Metrics */
+    .stMetric {
+        background-color: #FFD1DC;
+        border-radius: 15px;
+        padding: 10px;
+        box-shadow: 0px 4px 8px rgba(255, 105, 180, 0.1);
+    }
+
+    /* Custom chart container */
+    .chart-container {
+        background-color: white;
+        border-radius: 20px;
+        padding: 20px;
+        box-shadow: 0px 4px 12px rgba(255, 105, 180, 0.2);
+    }
+    
+    /* Cards and boxes rendered by components.py */
+    .gm-card {
+        background-color: #FFD1DC;
+        padding: 15px;
+        border-radius: 15px;
+        margin: 10px 0;
+    }
+
+    .gm-box {
+        background-color: #FFD1DC;
+        padding: 20px;
+        border-radius: 15px;
+        margin: 10px 0;
+        text-align: center;
+        box-shadow: 0px 4px 12px rgba(255, 105, 180, 0.2);
+    }
+
+    .gm-box h3 {
+        color: #FF1493;
+        margin-bottom: 15px;
+    }
+
+    .gm-box .gm-savings {
+        font-size: 18px;
+    }
+
+    .gm-box .gm-statement {
+        font-size: 16px;
+        margin-top: 10px;
+    }
+
+    /* Links that look like the app's buttons */
+    .gm-button {
+        display: block;
+        text-align: center;
+        text-decoration: none;
+        background-color: #FF69B4;
+        color: white !important;
+        padding: 10px 20px;
+        border: none;
+        border-radius: 20px;
+        font-family: 'Quicksand', sans-serif;
+    }
+
+    .gm-button-secondary {
+        background-color: #FFD1DC;
+        color: #FF1493 !important;
+        border: 2px solid #FF69B4;
+    }
+
+    .gm-button-small {
+        padding: 5px 10px;
+        border-width: 1px;
+        border-radius: 10px;
+        font-size: 12px;
+    }
+
+    /* Search history */
+    .gm-history {
+        width: 100%;
+        border-collapse: separate;
+        border-spacing: 0 5px;
+    }
+
+    .gm-history td {
+        background-color: white;
+        padding: 10px;
+        border: none;
+        font-size: 14px;
+    }
+
+    .gm-history td.gm-title {
+        border-left: 4px solid #FF69B4;
+        border-radius: 10px 0 0 10px;
+        font-size: 15px;
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+        max-width: 400px;
+    }
+
+    /* Footer */
+    .footer {
+        font-size: 12px;
+        text-align: center;
+        margin-top: 30px;
+        color: #FF69B4;
+    }
+</style>
+
+<!-- Import girly fonts -->
+<link href="https://fonts.googleapis.com/css2?family=Pacifico&family=Quicksand:wght@400;700&display=swap" rel="stylesheet">
+"""
+
+_GIRL_MATH_BOX = Template(
+    '<div class="gm-box"><h3>By Girl Math Logic...</h3>'
+    '<p class="gm-savings">You\'re <b>saving $$${savings}</b> (${percent}% off its usual price)!</p>'
+    '<p class="gm-statement">${statement}</p></div>'
+)
+_CARD = Template('<div class="gm-card"><p>${body}</p></div>')
+_MATCH_NOTE = Template('<br><small>Matched "${title}" (${confidence} match)</small>')
+_LINK_BUTTON = Template('<a class="${classes}" href="${url}" target="_blank">${label}</a>')
+_HISTORY_TABLE = Template('<table class="gm-history"><tbody>${rows}</tbody></table>')
+_HISTORY_ROW = Template(
+    '<tr><td class="gm-title" title="${title}">${title}</td>'
+    '<td>Current price: <b>${price}</b></td>'
+    '<td><a class="gm-button gm-button-secondary gm-button-small" href="${url}" target="_blank">View Item</a></td></tr>'
+)
+
+
+def markdown_escape(text):
+    """Backslash-escape text so st.markdown and friends show it as typed"""
+    return _MARKDOWN_SPECIAL_RE.sub(r'\\\1', str(text))
+
+
+def girl_math_box(savings, percent, statement):
+    """The "By Girl Math Logic..." results box"""
+    return _GIRL_MATH_BOX.substitute(savings=f"{savings:.2f}", percent=f"{percent:.1f}", statement=escape(statement))
+
+
+def store_card(display_name, result, current_price):
+    """One store's price compared with Amazon's, or why there isn't one
+
+    result is an outcome from stores.collect_store_results: a result dict,
+    None when the store has no match, or the StoreSearchError of a store
+    that couldn't be searched, which is not the same as "not found".
+    """
+    store = escape(display_name)
+    if isinstance(result, StoreTimeout):
+        return _CARD.substitute(body=f"Still checking {store}, it'll be here next time you look ⏳")
+    if isinstance(result, StoreSearchError):
+        return _CARD.substitute(body=f"Couldn't check {store} right now, try again in a bit 🙈")
+    if result and result['price_cents'] is not None and result['currency'] == 'USD':
+        store_price = format_cents(result['price_cents'])
+
+        # Compare prices, in cents so $0.01 differences are exact
+        diff_cents = round(current_price * 100) - result['price_cents']
+
+        if diff_cents > 0:
+            body = f"{store} price: <b>{store_price}</b> (You'd save <b>{format_cents(diff_cents)}</b> shopping at {store}!)"
+        elif diff_cents < 0:
+            body = f"{store} price: <b>{store_price}</b> (Amazon is <b>{format_cents(-diff_cents)}</b> cheaper!)"
+        else:
+            body = f"{store} price: <b>{store_price}</b> (Same as Amazon!)"
+    elif result:
+        body = f"{store} price: <b>{escape(result['price_text'])}</b>"
+    else:
+        body = f"Couldn't find this product on {store} 😔"
+
+    # Say which listing we matched so a wrong match is easy to spot
+    if result and result.get('match_title'):
+        body += _MATCH_NOTE.substitute(title=escape(result['match_title']), confidence=f"{result['confidence']:.0%}")
+
+    return _CARD.substitute(body=body)
+
+
+def link_button(url, label, secondary=False):
+    """A link styled like the app's buttons"""
+    classes = 'gm-button gm-button-secondary' if secondary else 'gm-button'
+    return _LINK_BUTTON.substitute(classes=classes, url=escape(url), label=escape(label))
+
+
+def history_pages(items, page_size=HISTORY_PAGE_SIZE):
+    """How many pages the search history table has"""
+    return max(1, -(-len(items) // page_size))
+
+
+def history_table(items, page=1, page_size=HISTORY_PAGE_SIZE):
+    """One page of the search history, newest first, as a single HTML table
+
+    Each page is one element no matter how long the history gets, so
+    rendering it costs the same on every rerun.
+    """
+    end = len(items) - (page - 1) * page_size
+    rows = ''.join(
+        _HISTORY_ROW.substitute(
+            title=escape(item['title']), price=f"${item['current_price']:.2f}", url=escape(item['url']),
+        )
+        for item in reversed(items[max(0, end - page_size):max(0, end)])
+    )
+    return _HISTORY_TABLE.substitute(rows=rows)
@@ -0,0 +1,28 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Store lookups are network bound, a handful of workers is plenty
+DEFAULT_MAX_WORKERS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers=DEFAULT_MAX_WORKERS):
+    """Return the shared, bounded worker pool used for store lookups"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="girl-math-fetch")
+        return _executor
+
+
+def submit_fetch(func, *args, **kwargs):
+    """Start a lookup in the background and return its future
+
+    The caller's context is copied into the worker, so spans recorded there
+    still show up in the caller's tracing.collect() block.
+    """
+    return get_executor().submit(contextvars.copy_context().run, func, *args, **kwargs)
+
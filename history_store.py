@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from matching import keepa_identifiers
+from price_series import PriceSeries
+
+DEFAULT_HISTORY_PATH = os.environ.get("GIRL_MATH_HISTORY_PATH", ".girl_math_history.sqlite")
+# Don't ask Keepa again if we synced this product more recently than this
+DEFAULT_MIN_SYNC_INTERVAL = 60 * 60
+# Re-fetch one extra day so points Keepa backfilled late are not missed
+SYNC_OVERLAP_DAYS = 1
+# PRAGMA user_version of the current layout. 1: prices are stored in dollars
+# as keepa parses them (version 0 stores divided them by 100 once more)
+SCHEMA_VERSION = 1
+
+
+class PriceHistoryStore:
+    """Local, append-only price history per (asin, domain) in SQLite
+
+    Points are kept as (timestamp, price) rows clustered by product, so a
+    product's whole history loads with one index range scan straight into
+    NumPy arrays. sync() only asks Keepa for the days since the newest
+    stored point (plus an overlap) and adds the points it didn't have.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, min_sync_interval=DEFAULT_MIN_SYNC_INTERVAL, clock=time.time):
+        self.path = path
+        self.min_sync_interval = min_sync_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS price_points (
+                asin TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                price REAL NOT NULL,
+                PRIMARY KEY (asin, domain, ts)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS products (
+                asin TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                title TEXT,
+                last_ts INTEGER,
+                synced_at REAL NOT NULL,
+                identifiers TEXT,
+                PRIMARY KEY (asin, domain)
+            );
+        """)
+        # Stores created before identifiers were kept
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(products)")}
+        if 'identifiers' not in columns:
+            self._conn.execute("ALTER TABLE products ADD COLUMN identifiers TEXT")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._conn.execute("UPDATE price_points SET price = price * 100")
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def product(self, asin, domain='US'):
+        """Return (title, last_ts, synced_at) for a stored product, or None"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT title, last_ts, synced_at FROM products WHERE asin = ? AND domain = ?",
+                (asin.upper(), domain.upper()),
+            ).fetchone()
+
+    def identifiers(self, asin, domain='US'):
+        """Return the stored brand/model/upc dict for a product (empty if unknown)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT identifiers FROM products WHERE asin = ? AND domain = ?",
+                (asin.upper(), domain.upper()),
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def load(self, asin, domain='US'):
+        """Return the stored history as a PriceSeries (empty if unknown)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, price FROM price_points WHERE asin = ? AND domain = ? ORDER BY ts",
+                (asin.upper(), domain.upper()),
+            ).fetchall()
+        if not rows:
+            return PriceSeries(np.array([], dtype='datetime64[s]'), np.array([]))
+        points = np.array(rows, dtype=np.float64)
+        return PriceSeries(points[:, 0].astype(np.int64).astype('datetime64[s]'), points[:, 1])
+
+    def append(self, asin, series, title=None, domain='US', identifiers=None):
+        """Add the points of series that aren't stored yet
+
+        Points already stored (same timestamp) are kept as they are, so a
+        re-fetched overlap only adds what Keepa backfilled late. Returns how
+        many points were added.
+        """
+        asin, domain = asin.upper(), domain.upper()
+        timestamps = series.times.astype(np.int64)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_ts FROM products WHERE asin = ? AND domain = ?", (asin, domain)
+            ).fetchone()
+            last_ts = row[0] if row and row[0] is not None else None
+
+            # The (asin, domain, ts) key dedupes points we already have
+            changes_before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO price_points (asin, domain, ts, price) VALUES (?, ?, ?, ?)",
+                ((asin, domain, int(ts), float(price)) for ts, price in zip(timestamps, series.prices)),
+            )
+            added = self._conn.total_changes - changes_before
+
+            if len(timestamps):
+                last_ts = max(int(timestamps.max()), last_ts if last_ts is not None else int(timestamps.max()))
+            self._conn.execute(
+                "INSERT INTO products (asin, domain, title, last_ts, synced_at, identifiers) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (asin, domain) DO UPDATE SET "
+                "title = COALESCE(excluded.title, title), last_ts = excluded.last_ts, synced_at = excluded.synced_at, "
+                "identifiers = COALESCE(excluded.identifiers, identifiers)",
+                (asin, domain, title, last_ts, self.clock(), json.dumps(identifiers) if identifiers else None),
+            )
+            self._conn.commit()
+        return added
+
+    def sync(self, api, asin, domain='US', force=False):
+        """Bring a product's stored history up to date and return (title, series)
+
+        First sync pulls the full history. After that Keepa is only asked
+        for the days since the newest stored point, and not at all if the
+        product was synced within min_sync_interval (unless force is set).
+        Returns (None, None) if Keepa has nothing for the product.
+        """
+        stored = self.product(asin, domain)
+        now = self.clock()
+
+        if stored is not None and not force and now - stored[2] < self.min_sync_interval:
+            return stored[0], self.load(asin, domain)
+
+        days = None
+        if stored is not None and stored[1] is not None:
+            days = max(1, math.ceil((now - stored[1]) / 86400)) + SYNC_OVERLAP_DAYS
+
+        products = api.query(asin, domain=domain, days=days) if days else api.query(asin, domain=domain)
+        if not products:
+            return (stored[0], self.load(asin, domain)) if stored else (None, None)
+
+        product = products[0]
+        title = product.get('title')
+        self.append(asin, PriceSeries.from_keepa(product), title=title, domain=domain,
+                    identifiers=keepa_identifiers(product))
+        return title or (stored[0] if stored else None), self.load(asin, domain)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_history_store(path=DEFAULT_HISTORY_PATH):
+    """Return the process-wide history store, creating it on first use"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PriceHistoryStore(path)
+        return _default_store
@@ -0,0 +1,171 @@
+import functools
+import math
+import re
+
+# Below this confidence a candidate is treated as "not found" rather than
+# shown as a price for the wrong product
+MIN_CONFIDENCE = 0.45
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+# "40 oz", "1.5L", "12-pack": joined into one token so sizes compare as a unit
+_SIZE_RE = re.compile(
+    r"\b(\d+(?:\.\d+)?)\s*-?\s*(fl\.?\s*oz|oz|ml|l|lbs?|g|kg|in|inch|ft|pack|pk|ct|count|gb|tb|w|mah)\b"
+)
+# "2nd", "3rd": generations and editions, compared like sizes
+_ORDINAL_RE = re.compile(r"^\d+(?:st|nd|rd|th)$")
+_DIGITS_RE = re.compile(r"\D")
+_STOPWORDS = frozenset({'a', 'an', 'and', 'by', 'in', 'of', 'on', 'or', 'the', 'to', 'with', 'new'})
+# "Case for AirPods Pro": what comes before these words is the thing being
+# sold. Accessory nouns alone ("case") are too often part of the product.
+_RELATION_RE = re.compile(r"\b(?:for|compatible with|fits)\b")
+_ACCESSORY_WORDS = frozenset({'replacement', 'accessory', 'accessories'})
+# "Apple" and "Apple Inc." are the same brand; "Acme Inc." and "Apple Inc." aren't
+_COMPANY_WORDS = frozenset({'inc', 'llc', 'ltd', 'co', 'corp', 'corporation', 'company', 'gmbh', 'brands'})
+
+
+class Analyzed:
+    """A title broken into the features matching compares"""
+
+    __slots__ = ('tokens', 'models', 'variants', 'accessories', 'head')
+
+    def __init__(self, tokens, models, variants, accessories, head):
+        self.tokens = tokens
+        self.models = models
+        # Sizes and generations; two listings that both name one and differ
+        # are different products
+        self.variants = variants
+        self.accessories = accessories
+        # Tokens before "for"/"compatible with", or None if the title has none
+        self.head = head
+
+
+@functools.lru_cache(maxsize=4096)
+def analyze(title):
+    """Tokenize a title once; the same Amazon title is matched against every store"""
+    text = (title or '').lower()
+    sizes = frozenset(
+        f"{float(number):g}" + re.sub(r'\W', '', unit)
+        for number, unit in _SIZE_RE.findall(text)
+    )
+    tokens = frozenset(t for t in _TOKEN_RE.findall(_SIZE_RE.sub(' ', text)) if t not in _STOPWORDS) | sizes
+    # Model numbers mix letters and digits (WH1000XM5, A2084, H2.0)
+    models = frozenset(
+        t for t in tokens
+        if len(t) >= 4 and t not in sizes and not _ORDINAL_RE.match(t)
+        and any(c.isdigit() for c in t) and any(c.isalpha() for c in t)
+    )
+    variants = sizes | frozenset(t for t in tokens if _ORDINAL_RE.match(t))
+    relation = _RELATION_RE.search(text)
+    head = frozenset(_TOKEN_RE.findall(text[:relation.start()])) - _STOPWORDS if relation else None
+    return Analyzed(tokens, models, variants, tokens & _ACCESSORY_WORDS, head)
+
+
+def keepa_identifiers(product):
+    """Return the brand, model and upc of a raw Keepa product, skipping unknowns"""
+    model = product.get('model') or product.get('partNumber')
+    upcs = product.get('upcList') or product.get('eanList') or []
+    identifiers = {'brand': product.get('brand'), 'model': model, 'upc': upcs[0] if upcs else None}
+    return {key: value for key, value in identifiers.items() if value}
+
+
+def _normalize_upc(upc):
+    digits = _DIGITS_RE.sub('', str(upc or ''))
+    # UPC-A and EAN-13 differ by a leading zero
+    return digits.lstrip('0') or None
+
+
+def _idf_weights(query, candidates):
+    """IDF over the candidates on this page
+
+    Words every result shares (the category the store searched for) count
+    for little; the words that tell the results apart count for a lot.
+    """
+    df = {}
+    for analyzed in candidates:
+        for token in analyzed.tokens:
+            df[token] = df.get(token, 0) + 1
+    n = len(candidates)
+    return {token: math.log((1 + n) / (1 + df.get(token, 0))) + 1 for token in query.tokens | df.keys()}
+
+
+def _similarity(query, candidate, weights):
+    """Blend of weighted token-set ratio and TF-IDF cosine, both in [0, 1]"""
+    shared = query.tokens & candidate.tokens
+    if not shared:
+        return 0.0
+    shared_weight = sum(weights[t] for t in shared)
+    query_weight = sum(weights[t] for t in query.tokens)
+    candidate_weight = sum(weights[t] for t in candidate.tokens)
+    # Store titles are usually a short subset of the long Amazon title, so the
+    # set ratio is measured against the smaller side
+    set_ratio = shared_weight / min(query_weight, candidate_weight)
+    cosine = sum(weights[t] ** 2 for t in shared) / math.sqrt(
+        sum(weights[t] ** 2 for t in query.tokens) * sum(weights[t] ** 2 for t in candidate.tokens)
+    )
+    return 0.6 * set_ratio + 0.4 * cosine
+
+
+def score_candidate(query, candidate, weights, brand=None, model=None, upc=None):
+    """Return the confidence in [0, 1] that candidate is the queried product"""
+    query_upc = _normalize_upc(upc)
+    if query_upc and query_upc == _normalize_upc(candidate.get('upc')):
+        return 1.0
+
+    analyzed = analyze(candidate['title'])
+    score = _similarity(query, analyzed, weights)
+
+    if brand:
+        brand_tokens = analyze(brand).tokens - _COMPANY_WORDS
+        candidate_brand = candidate.get('brand')
+        if candidate_brand:
+            # Brands written differently ("Apple" / "Apple Inc.") share a
+            # word; only a brand with nothing in common is another maker
+            score = score + 0.1 if analyze(candidate_brand).tokens & brand_tokens else score * 0.5
+        elif brand_tokens and brand_tokens <= analyzed.tokens:
+            score += 0.1
+
+    query_models = query.models | (analyze(model).models if model else frozenset())
+    if query_models:
+        if query_models & analyzed.models:
+            score += 0.15
+        elif analyzed.models:
+            # Both name a model and they differ: a sibling product
+            score *= 0.7
+
+    # "Slippers for Women" is the product; "Silicone Cover for AirPods" is not
+    for_something_else = analyzed.head is not None and len(analyzed.head & query.tokens) * 2 < len(analyzed.head)
+    if for_something_else or analyzed.accessories - query.accessories:
+        score *= 0.5
+    if query.variants and analyzed.variants and not query.variants & analyzed.variants:
+        score *= 0.5
+
+    return max(0.0, min(1.0, score))
+
+
+def rank_candidates(item_title, candidates, brand=None, model=None, upc=None):
+    """Return [(confidence, candidate)] best first
+
+    candidates are dicts with at least 'title', and optionally 'brand' and
+    'upc'. Scoring only uses what the results page already contains, so no
+    candidate costs an extra request.
+    """
+    candidates = [c for c in candidates if c.get('title')]
+    if not candidates:
+        return []
+    query = analyze(item_title)
+    weights = _idf_weights(query, [analyze(c['title']) for c in candidates])
+    scored = [(score_candidate(query, c, weights, brand, model, upc), c) for c in candidates]
+    # Stable sort keeps page order (the store's relevance) between equal scores
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return scored
+
+
+def best_match(item_title, candidates, brand=None, model=None, upc=None, min_confidence=MIN_CONFIDENCE):
+    """Return (candidate, confidence) for the best match, or (None, best confidence)"""
+    ranked = rank_candidates(item_title, candidates, brand, model, upc)
+    if not ranked:
+        return None, 0.0
+    confidence, candidate = ranked[0]
+    if confidence < min_confidence:
+        return None, confidence
+    return candidate, confidence
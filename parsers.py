@@ -0,0 +1,203 @@
+import json
+import re
+
+# Different possible selectors for Walmart prices, in order of preference
+WALMART_PRICE_SELECTORS = [
+    'span[data-automation-id="product-price"]',
+    'span.price-characteristic',
+    'span.price-group',
+    'div.product-price-container span.price'
+]
+# One search result tile, and where its title sits inside it
+WALMART_TILE_SELECTOR = 'div[data-item-id]'
+WALMART_TITLE_SELECTORS = [
+    'span[data-automation-id="product-title"]',
+    'a span',
+]
+
+# Next.js pages ship their data as JSON in this script tag; grabbing it with a
+# regex is far cheaper than building a DOM for the whole page
+NEXT_DATA_RE = re.compile(
+    r'<script[^>]*\bid=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>',
+    re.DOTALL | re.IGNORECASE,
+)
+
+_available_backends = None
+_compiled_selectors = {}
+
+
+def available_backends():
+    """Return the HTML parser backends that can be imported here
+
+    Fastest first; html.parser ships with Python and is always last.
+    """
+    global _available_backends
+    if _available_backends is None:
+        found = []
+        try:
+            import selectolax.lexbor  # noqa: F401
+            found.append('selectolax')
+        except ImportError:
+            pass
+        try:
+            import lxml  # noqa: F401
+            found.append('lxml')
+        except ImportError:
+            pass
+        found.append('html.parser')
+        _available_backends = found
+    return _available_backends
+
+
+def default_backend():
+    """Return the fastest available parser backend"""
+    return available_backends()[0]
+
+
+def extract_next_data(html):
+    """Return the page's embedded __NEXT_DATA__ JSON, or None"""
+    match = NEXT_DATA_RE.search(html)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def walmart_next_data_items(data):
+    """Yield the product items from Walmart search __NEXT_DATA__"""
+    try:
+        stacks = data['props']['pageProps']['initialData']['searchResult']['itemStacks']
+    except (KeyError, TypeError):
+        return
+    for stack in stacks or []:
+        for item in stack.get('items') or []:
+            if item.get('__typename', 'Product') == 'Product':
+                yield item
+
+
+def walmart_item_price(item):
+    """Return a Walmart search item's display price string, or None"""
+    price_info = item.get('priceInfo') or {}
+    current = price_info.get('currentPrice') or {}
+    for price in (current.get('priceString'), price_info.get('linePrice'), price_info.get('priceRangeString')):
+        if price:
+            return price.strip()
+    if isinstance(item.get('price'), (int, float)) and item['price'] > 0:
+        return f"${item['price']:.2f}"
+    return None
+
+
+def walmart_next_data_candidates(data):
+    """Return every product in Walmart search __NEXT_DATA__ as a candidate dict"""
+    candidates = []
+    for item in walmart_next_data_items(data):
+        price = walmart_item_price(item)
+        if not price:
+            continue
+        url = item.get('canonicalUrl')
+        candidates.append({
+            'title': item.get('name'),
+            'price_text': price,
+            'brand': item.get('brand'),
+            'upc': item.get('upc'),
+            'url': f"https://www.walmart.com{url}" if url and url.startswith('/') else url,
+        })
+    return candidates
+
+
+def _compiled(selector):
+    """Compile a CSS selector for the BeautifulSoup backends, once per process"""
+    compiled = _compiled_selectors.get(selector)
+    if compiled is None:
+        import soupsieve
+        compiled = _compiled_selectors[selector] = soupsieve.compile(selector)
+    return compiled
+
+
+def select_first_text(html, selectors, backend=None):
+    """Return the text of the first element matching the earliest selector
+
+    Selectors are tried in order and each search stops at its first hit,
+    instead of collecting every match in the document.
+    """
+    backend = backend or default_backend()
+
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(html)
+        for selector in selectors:
+            node = tree.css_first(selector)
+            if node is not None:
+                return node.text().strip()
+        return None
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, backend)
+    for selector in selectors:
+        node = _compiled(selector).select_one(soup)
+        if node is not None:
+            return node.text.strip()
+    return None
+
+
+def select_candidates(html, tile_selector, title_selectors, price_selectors, backend=None):
+    """Return a {'title', 'price_text'} candidate for every result tile on a page
+
+    The page is parsed once and each tile is searched on its own, so every
+    listing can be scored without fetching its product page.
+    """
+    backend = backend or default_backend()
+    candidates = []
+
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        for tile in LexborHTMLParser(html).css(tile_selector):
+            title = next((node.text().strip() for node in map(tile.css_first, title_selectors) if node is not None), None)
+            price = next((node.text().strip() for node in map(tile.css_first, price_selectors) if node is not None), None)
+            if title and price:
+                candidates.append({'title': title, 'price_text': price})
+        return candidates
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, backend)
+    title_selectors = [_compiled(selector) for selector in title_selectors]
+    price_selectors = [_compiled(selector) for selector in price_selectors]
+    for tile in _compiled(tile_selector).select(soup):
+        title = next((node.text.strip() for node in (s.select_one(tile) for s in title_selectors) if node is not None), None)
+        price = next((node.text.strip() for node in (s.select_one(tile) for s in price_selectors) if node is not None), None)
+        if title and price:
+            candidates.append({'title': title, 'price_text': price})
+    return candidates
+
+
+def parse_walmart_candidates(html, backend=None):
+    """Return every priced product on a Walmart search page as a candidate dict
+
+    Uses the __NEXT_DATA__ JSON when present (which also carries brand and
+    UPC), and falls back to the result tiles in the HTML.
+    """
+    data = extract_next_data(html)
+    if data is not None:
+        candidates = walmart_next_data_candidates(data)
+        if candidates:
+            return candidates
+
+    return select_candidates(html, WALMART_TILE_SELECTOR, WALMART_TITLE_SELECTORS, WALMART_PRICE_SELECTORS, backend)
+
+
+def parse_walmart_price(html, backend=None):
+    """Return the first price on a Walmart search page as a string, or None
+
+    Reads the embedded __NEXT_DATA__ JSON when present, which avoids
+    parsing the HTML at all, and falls back to CSS selectors.
+    """
+    data = extract_next_data(html)
+    if data is not None:
+        for item in walmart_next_data_items(data):
+            price = walmart_item_price(item)
+            if price:
+                return price
+
+    return select_first_text(html, WALMART_PRICE_SELECTORS, backend)
@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Keepa's raw price format is in cents, we work in dollars
+PRICE_SCALE = 100
+# Default point budget for charts; more than this just bloats the Vega-Lite payload
+DEFAULT_CHART_POINTS = 1000
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def minmax_downsample(prices, max_points=DEFAULT_CHART_POINTS):
+    """Return sorted indices of at most max_points points that keep the shape
+
+    The first and last points are always kept, and the rest of the series
+    is cut into equal buckets keeping each bucket's lowest and highest
+    point. The global peak and trough therefore survive exactly.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    n = len(prices)
+    if n <= max_points or max_points < 4:
+        return np.arange(n) if n <= max_points else np.array([0, n - 1])
+
+    # Two points per bucket, plus the fixed first and last points
+    buckets = (max_points - 2) // 2
+    interior = prices[1:-1]
+    size = -(-len(interior) // buckets)
+
+    # Pad to a full grid so every bucket is reduced in a single vectorized pass
+    padded = np.full(buckets * size, np.nan)
+    padded[:len(interior)] = interior
+    grid = padded.reshape(buckets, size)
+    # Buckets that are entirely padding would make nanargmin raise
+    filled = ~np.isnan(grid).all(axis=1)
+    grid = grid[filled]
+    offsets = np.flatnonzero(filled) * size + 1
+
+    lows = offsets + np.nanargmin(grid, axis=1)
+    highs = offsets + np.nanargmax(grid, axis=1)
+    return np.unique(np.concatenate(([0], lows, highs, [n - 1])))
+
+
+class PriceSeries:
+    """A cleaned price history backed by NumPy arrays
+
+    times is a datetime64[s] array and prices a float64 array in dollars,
+    both in chronological order with missing and out-of-stock points
+    already dropped. Summary stats are computed once, lazily.
+    """
+
+    def __init__(self, times, prices):
+        self.times = np.asarray(times, dtype='datetime64[s]')
+        self.prices = np.asarray(prices, dtype=np.float64)
+        if self.times.shape != self.prices.shape:
+            raise ValueError("times and prices must be the same length")
+        self._stats = None
+
+    @classmethod
+    def from_keepa(cls, product, key='NEW'):
+        """Build a series from a product as keepa.Keepa.query returns it
+
+        keepa has already parsed the history (dollars, NaN when out of
+        stock, datetimes), so prices are not rescaled. Uses Keepa's real
+        timestamps from product['data'][key + '_time'].
+        Histories without timestamps fall back to one point per hour
+        ending now, which is what the app used to assume.
+        """
+        data = product['data']
+        raw_prices = np.asarray(data[key], dtype=np.float64)
+        raw_times = data.get(f'{key}_time')
+
+        if raw_times is None or len(raw_times) != len(raw_prices):
+            end = np.datetime64(datetime.now(), 's')
+            raw_times = end - np.arange(len(raw_prices), 0, -1).astype('timedelta64[h]')
+        elif np.asarray(raw_times).dtype == object:
+            # keepa hands out naive UTC datetimes; subtracting the epoch from
+            # the whole array is several times faster than converting each one
+            raw_times = ((np.asarray(raw_times) - _EPOCH) // _SECOND).astype(np.int64).astype('datetime64[s]')
+
+        return cls.from_raw(raw_times, raw_prices, scale=1)
+
+    @classmethod
+    def from_raw(cls, times, prices, scale=PRICE_SCALE):
+        """Clean and scale Keepa points in one vectorized pass
+
+        Drops NaN (out of stock) and non-positive (no offer) points, then
+        divides by scale: the default turns Keepa's raw integer cents into
+        dollars.
+        """
+        times = np.asarray(times, dtype='datetime64[s]')
+        prices = np.asarray(prices, dtype=np.float64)
+        valid = np.isfinite(prices) & (prices > 0)
+        return cls(times[valid], prices[valid] / scale)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __getstate__(self):
+        # Stats are cheap to rebuild, no need to pickle them into the cache
+        return {'times': self.times, 'prices': self.prices}
+
+    def __setstate__(self, state):
+        self.times = state['times']
+        self.prices = state['prices']
+        self._stats = None
+
+    @property
+    def empty(self):
+        return len(self.prices) == 0
+
+    def stats(self):
+        """Return current, peak and lowest price"""
+        if self._stats is None:
+            if self.empty:
+                raise ValueError("price series is empty")
+            self._stats = {
+                'current_price': float(self.prices[-1]),
+                'peak_price': float(self.prices.max()),
+                'lowest_price': float(self.prices.min()),
+            }
+        return self._stats
+
+    @property
+    def current_price(self):
+        return self.stats()['current_price']
+
+    @property
+    def peak_price(self):
+        return self.stats()['peak_price']
+
+    @property
+    def lowest_price(self):
+        return self.stats()['lowest_price']
+
+    def percentiles(self, q=(10, 25, 50, 75, 90)):
+        """Return {percentile: price} for the requested percentiles"""
+        values = np.percentile(self.prices, q)
+        return {p: float(v) for p, v in zip(q, values)}
+
+    def window(self, days):
+        """Return the sub-series covering the last `days` days of history"""
+        if self.empty:
+            return self
+        start = self.times[-1] - np.timedelta64(int(days * 24 * 60), 'm')
+        first = np.searchsorted(self.times, start, side='left')
+        return PriceSeries(self.times[first:], self.prices[first:])
+
+    def window_stats(self, days):
+        """Return min/max/mean/median of the last `days` days of history"""
+        recent = self.window(days).prices
+        if len(recent) == 0:
+            return None
+        return {
+            'min': float(recent.min()),
+            'max': float(recent.max()),
+            'mean': float(recent.mean()),
+            'median': float(np.median(recent)),
+            'points': int(len(recent)),
+        }
+
+    def downsample(self, max_points=DEFAULT_CHART_POINTS):
+        """Return a series of at most max_points points for charting
+
+        Peaks, troughs and the current price are kept exactly; see
+        minmax_downsample.
+        """
+        if len(self) <= max_points:
+            return self
+        keep = minmax_downsample(self.prices, max_points)
+        return PriceSeries(self.times[keep], self.prices[keep])
+
+    def to_frame(self):
+        """Hand the arrays to pandas without copying, for charting"""
+        import pandas as pd
+        return pd.DataFrame({'date': self.times, 'price': self.prices}, copy=False)
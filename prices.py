@@ -0,0 +1,159 @@
+import re
+from collections import namedtuple
+
+DEFAULT_CURRENCY = 'USD'
+# parse_cents() marks strings with no price with this
+MISSING_CENTS = -1
+
+# cents is the (low end of the) price in hundredths of the currency unit.
+# high_cents is the top of a "$12.97 - $24.99" range, and unit_cents/unit a
+# "($0.54/oz)" unit price, each None when the text doesn't show one.
+Price = namedtuple('Price', ['cents', 'currency', 'high_cents', 'unit_cents', 'unit'])
+
+_CURRENCIES = {
+    '$': None,  # whatever default_currency is
+    'us$': 'USD', 'usd': 'USD',
+    'c$': 'CAD', 'ca$': 'CAD', 'cad': 'CAD',
+    'a$': 'AUD', 'au$': 'AUD', 'aud': 'AUD',
+    '€': 'EUR', 'eur': 'EUR',
+    '£': 'GBP', 'gbp': 'GBP',
+    '¥': 'JPY', 'jpy': 'JPY',
+}
+# Currencies usually written "1.299,00"
+_DECIMAL_COMMA_CURRENCIES = frozenset({'EUR'})
+
+_SYMBOL = r'US\$|CA?\$|AU?\$|USD|CAD|AUD|EUR|GBP|JPY|\$|€|£|¥'
+_MONEY_RE = re.compile(
+    rf'(?P<pre>{_SYMBOL})?\s*'
+    r'(?P<num>\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,3})?|\d+(?:[.,]\d{1,3})?)'
+    rf'(?:\s*(?P<post>¢|{_SYMBOL})(?![a-z]))?',
+    re.IGNORECASE,
+)
+# What follows a unit price: "/oz", "/fl oz", " per count"
+_UNIT_RE = re.compile(r'\s*(?:/|per\s+)\s*(?P<unit>fl\.?\s*oz|[a-z]+)', re.IGNORECASE)
+# "$12.97/ea" is just the price
+_EACH_UNITS = frozenset({'ea', 'each'})
+_RANGE_RE = re.compile(r'\s*(?:-|–|—|to)\s*', re.IGNORECASE)
+_BARE_DECIMAL_RE = re.compile(r'[.,]\d{2}$')
+# Most scraped prices are just "$12.97" or "$1,299.00"
+_PLAIN_RE = re.compile(r'\s*\$(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d\d))?\s*')
+
+
+def _currency(match, default_currency):
+    symbol = match.group('pre') or match.group('post')
+    if not symbol or symbol == '¢':
+        return default_currency
+    return _CURRENCIES[symbol.lower()] or default_currency
+
+
+def _to_cents(number, currency):
+    """Turn '1,299.00' / '1.299,00' / '12' into integer hundredths, without floats"""
+    comma, dot = number.rfind(','), number.rfind('.')
+    if comma >= 0 and dot >= 0:
+        decimal = max(comma, dot)
+    elif comma >= 0:
+        # "12,99" is a decimal comma; "1,299" and "1,299,000" are thousands
+        decimal = comma if number.count(',') == 1 and len(number) - comma - 1 == 2 else -1
+    elif dot >= 0:
+        # "1.299" in euros and "1.299.000" anywhere are thousands
+        thousands = number.count('.') > 1 or (currency in _DECIMAL_COMMA_CURRENCIES and len(number) - dot - 1 == 3)
+        decimal = -1 if thousands else dot
+    else:
+        decimal = -1
+
+    if decimal < 0:
+        whole, fraction = number, ''
+    else:
+        whole, fraction = number[:decimal], number[decimal + 1:]
+    whole = int(re.sub(r'\D', '', whole) or 0)
+    fraction = (fraction + '000')[:3]
+    cents = whole * 100 + int(fraction[:2])
+    # Round a third decimal (unit prices like $0.545/oz) half up
+    return cents + (1 if int(fraction[2]) >= 5 else 0)
+
+
+def _is_price(match):
+    """A bare number is only a price if it has a currency or exactly two decimals"""
+    return bool(match.group('pre') or match.group('post')) or bool(_BARE_DECIMAL_RE.search(match.group('num')))
+
+
+def parse_price(text, default_currency=DEFAULT_CURRENCY):
+    """Parse a displayed price into a Price, or None if the text has none
+
+    Handles thousands separators ("$1,299.00"), whole dollars ("$12"),
+    cents ("99¢"), decimal commas ("12,99 €"), ranges ("$12.97 - $24.99")
+    and unit prices ("$5.98 ($0.25/oz)"). The first price that isn't a
+    unit price is the price; a "$" with no other hint is default_currency.
+    """
+    if not text:
+        return None
+    plain = _PLAIN_RE.fullmatch(text)
+    if plain is not None:
+        cents = int(plain.group(1).replace(',', '')) * 100 + int(plain.group(2) or 0)
+        return Price(cents, default_currency, None, None, None)
+
+    price = high = unit_cents = unit = None
+    currency = default_currency
+    position = 0
+    while True:
+        match = _MONEY_RE.search(text, position)
+        if match is None:
+            break
+        position = match.end()
+        if not _is_price(match):
+            continue
+
+        match_currency = _currency(match, default_currency)
+        cents = _to_cents(match.group('num'), match_currency)
+        if match.group('post') == '¢':
+            # "12.5¢" is an eighth of a dollar, not twelve and a half
+            cents = (cents + 50) // 100
+
+        unit_match = _UNIT_RE.match(text, position)
+        if unit_match is not None and unit_match.group('unit').lower() in _EACH_UNITS:
+            position = unit_match.end()
+        elif unit_match is not None:
+            if unit_cents is None:
+                unit_cents, unit = cents, re.sub(r'\s+', ' ', unit_match.group('unit').lower())
+            position = unit_match.end()
+            continue
+
+        if price is None:
+            price, currency = cents, match_currency
+            range_match = _RANGE_RE.match(text, position)
+            if range_match is not None:
+                high_match = _MONEY_RE.match(text, range_match.end())
+                if high_match is not None and _is_price(high_match):
+                    high = _to_cents(high_match.group('num'), match_currency)
+                    position = high_match.end()
+
+    if price is None:
+        return None
+    return Price(price, currency, high, unit_cents, unit)
+
+
+def parse_cents(texts, default_currency=DEFAULT_CURRENCY):
+    """Parse a whole column of scraped price strings into an int64 array of cents
+
+    Strings without a price come back as MISSING_CENTS. Scraped columns
+    repeat the same few strings a lot, so each distinct string is only
+    parsed once. texts can be any iterable, including a pandas Series.
+    """
+    import numpy as np
+
+    seen = {}
+    cents = []
+    for text in texts:
+        value = seen.get(text)
+        if value is None:
+            price = parse_price(text, default_currency) if isinstance(text, str) else None
+            value = seen[text] = price.cents if price is not None else MISSING_CENTS
+        cents.append(value)
+    return np.array(cents, dtype=np.int64)
+
+
+def format_cents(cents, currency=DEFAULT_CURRENCY):
+    """Format cents for display, e.g. 129900 -> '$1,299.00'"""
+    symbol = {'USD': '$', 'CAD': 'C$', 'AUD': 'A$', 'EUR': '€', 'GBP': '£', 'JPY': '¥'}.get(currency, f'{currency} ')
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{symbol}{abs(cents) // 100:,}.{abs(cents) % 100:02d}"
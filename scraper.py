@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Headers to mimic a browser
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+DEFAULT_TIMEOUT = 10
+# Open connections kept per host; extra requests wait for a free one
+DEFAULT_CONNECTIONS_PER_HOST = 4
+# Requests per second allowed per host, with a small burst on top
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Responses remembered for If-None-Match / If-Modified-Since revalidation
+DEFAULT_CONDITIONAL_ENTRIES = 256
+
+
+class TokenBucket:
+    """Token-bucket rate limiter; acquire() blocks until a token is free"""
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+
+class ScraperClient:
+    """Shared HTTP client for the store scrapers
+
+    Keeps a pooled requests.Session so lookups reuse TCP/TLS connections,
+    caps connections per host, rate limits each host with a token bucket,
+    retries 429/5xx with exponential backoff (honouring Retry-After), and
+    revalidates repeat GETs with If-None-Match / If-Modified-Since.
+    """
+
+    def __init__(self, connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 conditional_entries=DEFAULT_CONDITIONAL_ENTRIES):
+        self.rate = rate
+        self.burst = burst
+        self.conditional_entries = conditional_entries
+
+        # requests is only needed once something is scraped, so keep it off
+        # the app's startup path
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=connections_per_host,
+            pool_block=True,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.headers.update(BROWSER_HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._buckets = {}
+        self._validated = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    def _remember(self, url, response):
+        if not (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            return
+        with self._lock:
+            self._validated[url] = response
+            self._validated.move_to_end(url)
+            while len(self._validated) > self.conditional_entries:
+                self._validated.popitem(last=False)
+
+    def get(self, url, headers=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+        """GET a URL through the pool, rate limiter and retry policy
+
+        If we still hold an earlier response with an ETag or Last-Modified
+        header, the request is sent conditionally and a 304 answer returns
+        that earlier response instead of downloading the page again.
+        """
+        headers = dict(headers or {})
+        with self._lock:
+            previous = self._validated.get(url)
+        if previous is not None:
+            if previous.headers.get('ETag'):
+                headers.setdefault('If-None-Match', previous.headers['ETag'])
+            if previous.headers.get('Last-Modified'):
+                headers.setdefault('If-Modified-Since', previous.headers['Last-Modified'])
+
+        self._bucket(urlsplit(url).netloc).acquire()
+        response = self.session.get(url, headers=headers, timeout=timeout, **kwargs)
+
+        if response.status_code == 304 and previous is not None:
+            return previous
+        if response.status_code == 200:
+            self._remember(url, response)
+        return response
+
+    def resolve_redirects(self, url, timeout=DEFAULT_TIMEOUT):
+        """Follow redirects with HEAD requests and return the final URL"""
+        self._bucket(urlsplit(url).netloc).acquire()
+        response = self.session.head(url, allow_redirects=True, timeout=timeout)
+        return response.url
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def configure_scraper_client(**kwargs):
+    """Replace the process-wide scraper client with one built from kwargs"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is not None:
+            _default_client.close()
+        _default_client = ScraperClient(**kwargs)
+        return _default_client
+
+
+def get_scraper_client():
+    """Return the process-wide scraper client, creating it on first use"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = ScraperClient()
+        return _default_client
@@ -0,0 +1,299 @@
+"""Lookups shared by every session in the process
+
+In a shared deployment a product that goes viral is looked up by many
+sessions at once. LookupService sits in front of Keepa and the stores so
+that those sessions share the work:
+
+- concurrent lookups of the same product or store search share one
+  in-flight fetch (single flight)
+- results land in caches every session reads: the process-wide product
+  cache and a bounded store result cache
+- Keepa tokens, which every session spends from the same key, are split
+  fairly between the users spending them, so one user refreshing a
+  wishlist can't starve everyone else
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from cache import MemoryProductCache, get_product_cache
+from stores import STORES, StoreSearchError, search_store
+from tracing import incr, set_gauge
+from utils import KEEPA_MAX_ASINS_PER_QUERY, get_amazon_product_info, get_amazon_products_info
+
+# Keepa charges one token per product looked up with its price history
+KEEPA_TOKENS_PER_PRODUCT = 1
+# Used until Keepa has told us the key's refill rate
+DEFAULT_KEEPA_TOKENS_PER_MINUTE = int(os.environ.get("GIRL_MATH_KEEPA_TOKENS_PER_MINUTE", 20))
+# Store prices move faster than Keepa history
+STORE_TTL = 60 * 60
+STORE_MAX_ENTRIES = 1000
+# A store that failed (down, throttling us) is left alone this long before
+# it's searched again, instead of every session retrying it on every rerun
+STORE_ERROR_TTL = 60
+
+
+class KeepaBudgetExceeded(Exception):
+    """A user has used up their share of the Keepa token budget for now"""
+
+    def __init__(self, user, retry_after):
+        super().__init__(f"Keepa token share used up, retry in {retry_after:.0f}s")
+        self.user = user
+        self.retry_after = retry_after
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once and shares the outcome
+
+    The first caller for a key runs the function; callers that arrive
+    while it is running wait for it and get the same result, or the same
+    exception. Nothing is kept once the call finishes, caching is up to
+    the caller.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            incr('coalesced_requests', kind=self.name)
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class FairShareLimiter:
+    """Splits a token budget that refills every window between its users
+
+    Spending is tracked over a sliding window. Every user active in the
+    window (anyone who spent or asked to) may spend up to budget / active
+    users of it, rounded up, and everyone together never more than the
+    budget. A user alone gets the whole budget; a request bigger than what
+    is left is either refused (acquire) or cut down to it (grant).
+    """
+
+    def __init__(self, budget, window=60, clock=time.monotonic):
+        self.budget = budget
+        self.window = window
+        self.clock = clock
+        # (time, user, tokens), oldest first
+        self._spent = deque()
+        self._spent_by_user = {}
+        self._total = 0
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, user, tokens=1):
+        """Spend tokens for user, or raise KeepaBudgetExceeded"""
+        self._take(user, tokens, partial=False)
+
+    def grant(self, user, tokens):
+        """Spend as many of tokens as user has left, at least one, and return how many
+
+        Raises KeepaBudgetExceeded when the user can't have any.
+        """
+        return self._take(user, tokens, partial=True)
+
+    def _take(self, user, tokens, partial):
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            self._last_seen[user] = now
+
+            share = math.ceil(self.budget / len(self._last_seen))
+            used = self._spent_by_user.get(user, 0)
+            available = max(0, min(share - used, self.budget - self._total))
+            granted = min(tokens, available) if partial else tokens
+            if granted <= 0 or granted > available:
+                incr('keepa_budget_denials')
+                # Wait on whichever limit binds: the user's own spending or everyone's
+                own = used and share - used <= self.budget - self._total
+                raise KeepaBudgetExceeded(user, self._retry_after(now, user if own else None))
+
+            self._spent.append((now, user, granted))
+            self._spent_by_user[user] = used + granted
+            self._total += granted
+            set_gauge('keepa_budget_users', len(self._last_seen))
+            return granted
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self._spent and self._spent[0][0] <= cutoff:
+            _, user, tokens = self._spent.popleft()
+            self._total -= tokens
+            self._spent_by_user[user] -= tokens
+            if not self._spent_by_user[user]:
+                del self._spent_by_user[user]
+        for user in [user for user, seen in self._last_seen.items() if seen <= cutoff]:
+            del self._last_seen[user]
+
+    def _retry_after(self, now, user=None):
+        """Seconds until the oldest spending (of user, if given) leaves the window"""
+        for spent_at, spender, _ in self._spent:
+            if user is None or spender == user:
+                return max(0.0, spent_at + self.window - now)
+        return float(self.window)
+
+
+def _store_key(item_title, brand=None, model=None, upc=None):
+    return '\x1f'.join(str(part or '') for part in (item_title, brand, model, upc))
+
+
+def _refill_rate(api):
+    """Tokens per minute the Keepa key refills, once Keepa has said"""
+    rate = getattr(getattr(api, 'status', None), 'refillRate', None)
+    return rate if isinstance(rate, (int, float)) and rate > 0 else None
+
+
+class LookupService:
+    """Cached, coalesced and fairly rationed Keepa and store lookups
+
+    user identifies whoever the lookup is for (a session, say); lookups
+    without one share a single anonymous share of the budget.
+    """
+
+    def __init__(self, cache=None, history=None, store_ttl=STORE_TTL, store_max_entries=STORE_MAX_ENTRIES,
+                 store_error_ttl=STORE_ERROR_TTL):
+        self.cache = cache if cache is not None else get_product_cache()
+        self.history = history
+        self.store_results = MemoryProductCache(ttl=store_ttl, max_entries=store_max_entries)
+        self.store_errors = MemoryProductCache(ttl=store_error_ttl, max_entries=store_max_entries)
+        self._products = SingleFlight('product')
+        self._stores = SingleFlight('store')
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, api):
+        """The fair-share limiter for api's Keepa key, sized to its refill rate"""
+        key = getattr(api, 'accesskey', None) or id(api)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = FairShareLimiter(DEFAULT_KEEPA_TOKENS_PER_MINUTE)
+        limiter.budget = _refill_rate(api) or limiter.budget
+        return limiter
+
+    def product_info(self, api, asin, user=None, domain='US', refresh=False):
+        """get_amazon_product_info, shared by every concurrent lookup of (asin, domain)
+
+        Cache hits are free; only a lookup that reaches Keepa takes tokens
+        from the user's share, and only the one that actually runs. refresh
+        skips the caches and asks Keepa, which the user is charged for.
+        """
+        key = (asin.strip().upper(), domain.strip().upper(), refresh)
+        while True:
+            try:
+                return self._products.do(key, self._load_product, api, asin, user, domain, refresh)
+            except KeepaBudgetExceeded as e:
+                if e.user == user:
+                    raise
+                # We were waiting on someone else's lookup and their share ran out, try on ours
+
+    def _load_product(self, api, asin, user, domain, refresh):
+        cached = self.cache.get(asin, domain) if not refresh else None
+        if cached is not None:
+            incr('cache_requests', cache='product', result='hit')
+            return cached
+        self.limiter(api).acquire(user, KEEPA_TOKENS_PER_PRODUCT)
+        return get_amazon_product_info(api, asin, cache=self.cache, domain=domain, history=self.history, refresh=refresh)
+
+    def products_info(self, api, asins, user=None, domain='US'):
+        """get_amazon_products_info, charging the user only for products not cached
+
+        Batches go to Keepa as they are, without coalescing: two identical
+        wishlists in flight at once are rare, a viral single product isn't.
+        Each Keepa query is charged as it goes out and cut down to what is
+        left of the user's share; KeepaBudgetExceeded is raised once the
+        cached products and every product that fit are yielded.
+        """
+        pending = []
+        for asin in dict.fromkeys(a.strip().upper() for a in asins if a):
+            cached = self.cache.get(asin, domain)
+            if cached is not None:
+                incr('cache_requests', cache='product', result='hit')
+                yield asin, cached
+            else:
+                pending.append(asin)
+
+        limiter = self.limiter(api)
+        while pending:
+            chunk = pending[:KEEPA_MAX_ASINS_PER_QUERY]
+            granted = limiter.grant(user, len(chunk) * KEEPA_TOKENS_PER_PRODUCT) // KEEPA_TOKENS_PER_PRODUCT
+            yield from get_amazon_products_info(api, chunk[:granted], cache=self.cache, domain=domain)
+            del pending[:granted]
+
+    def store_result(self, store_name, item_title, brand=None, model=None, upc=None):
+        """search_store, cached and shared by every concurrent identical search
+
+        A store that couldn't be searched raises StoreSearchError again for
+        STORE_ERROR_TTL seconds instead of being searched again.
+        """
+        key = _store_key(item_title, brand, model, upc)
+        cached = self.store_results.get(key, store_name)
+        incr('cache_requests', cache='store', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return cached or None
+        error = self.store_errors.get(key, store_name)
+        if error is not None:
+            raise StoreSearchError(error)
+        return self._stores.do((store_name, key.upper()), self._load_store_result, store_name, key, item_title, brand, model, upc)
+
+    def _load_store_result(self, store_name, key, item_title, brand, model, upc):
+        try:
+            result = search_store(store_name, item_title, brand=brand, model=model, upc=upc)
+        except StoreSearchError as e:
+            self.store_errors.set(key, str(e), store_name)
+            raise
+        # "Not found" is cached too, as False since the cache returns None for a miss
+        self.store_results.set(key, result or False, store_name)
+        return result
+
+    def clear_store_results(self, item_title=None, brand=None, model=None, upc=None):
+        """Forget every store's result for one product, or for all of them without item_title"""
+        if item_title is None:
+            self.store_results.clear()
+            self.store_errors.clear()
+            return
+        key = _store_key(item_title, brand, model, upc)
+        for store_name in STORES:
+            self.store_results.invalidate(key, store_name)
+            self.store_errors.invalidate(key, store_name)
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def get_lookup_service():
+    """Return the process-wide lookup service, creating it on first use
+
+    It reads and fills the process-wide product cache and price history
+    store.
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            from history_store import get_history_store
+            _default_service = LookupService(get_product_cache(), history=get_history_store())
+        return _default_service
@@ -0,0 +1,241 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import quote_plus
+
+from fetch import submit_fetch
+from matching import best_match
+from prices import DEFAULT_CURRENCY, parse_price
+from parsers import parse_walmart_candidates, parse_walmart_price, select_candidates, select_first_text
+from scraper import get_scraper_client
+from tracing import span, incr
+
+DEFAULT_STORE_TIMEOUT = 10
+# Store searches work best on the first few words of the Amazon title
+QUERY_WORDS = 6
+
+
+class StoreSearchError(Exception):
+    """A store couldn't be searched: it didn't answer, answered with an error or the page broke parsing"""
+
+
+class StoreTimeout(StoreSearchError):
+    """A store was still searching when its result was collected"""
+
+
+class StoreAdapter:
+    """One store's search: build the query, fetch the page, parse and normalize the price
+
+    Subclasses set name, display_name and search_url, plus either the tile
+    and title selectors or their own parse_candidates(). Every result on the
+    page is scored against the Amazon product (see matching.py) and the best
+    match wins; an unscored price is never returned. parse() only tells a
+    page whose tiles can't be read (the layout changed) from one with no
+    results. fetch() and parsing are separate so adapters can be exercised
+    against saved HTML without the network.
+    """
+
+    name = None
+    display_name = None
+    # Formatted with the URL-encoded query
+    search_url = None
+    referer = None
+    price_selectors = []
+    # One result tile, and where its title sits inside it
+    tile_selector = None
+    title_selectors = []
+    # What a bare "$" means on this store's pages
+    currency = DEFAULT_CURRENCY
+    timeout = DEFAULT_STORE_TIMEOUT
+
+    def build_query(self, item_title):
+        """Limit the query to the first few words to improve search results"""
+        return ' '.join(item_title.split()[:QUERY_WORDS])
+
+    def build_url(self, query):
+        return self.search_url.format(query=quote_plus(query))
+
+    def fetch(self, url):
+        """Return the page HTML, or raise StoreSearchError if the store didn't answer with a 200"""
+        headers = {'Referer': self.referer} if self.referer else None
+        with span(f'{self.name}_fetch'):
+            response = get_scraper_client().get(url, headers=headers, timeout=self.timeout)
+        incr('http_responses', store=self.name, status=response.status_code)
+        if response.status_code != 200:
+            raise StoreSearchError(f"{self.display_name} answered {response.status_code}")
+        return response.text
+
+    def parse(self, html):
+        """Return the first price anywhere on a search results page as displayed, or None"""
+        return select_first_text(html, self.price_selectors)
+
+    def parse_candidates(self, html):
+        """Return every priced result on the page as {'title', 'price_text', ...} dicts"""
+        if not self.tile_selector:
+            return []
+        return select_candidates(html, self.tile_selector, self.title_selectors, self.price_selectors)
+
+    def normalize_price(self, price_text):
+        """Turn a displayed price like '$1,299.00' into a prices.Price, or None"""
+        return parse_price(price_text, self.currency)
+
+    def search(self, item_title, brand=None, model=None, upc=None):
+        """Search the store and return a result dict, or None if nothing was found
+
+        brand, model and upc (from Keepa, when known) sharpen the match. A
+        page with results but no confident match counts as not found, so a
+        case or a different size is never shown as the product's price.
+        Raises StoreSearchError when the store couldn't be searched, so a
+        failed search isn't mistaken for (and cached as) not found; that
+        includes a page showing prices but no result tiles we can read.
+        """
+        try:
+            url = self.build_url(self.build_query(item_title))
+            html = self.fetch(url)
+            with span(f'{self.name}_parse'):
+                candidates = self.parse_candidates(html)
+                if not candidates:
+                    if self.parse(html):
+                        incr('store_matches', store=self.name, result='unreadable')
+                        raise StoreSearchError(f"Couldn't read the results on {self.display_name}'s page")
+                    incr('store_matches', store=self.name, result='no_results')
+                    return None
+
+            with span('store_match'):
+                match, confidence = best_match(item_title, candidates, brand, model, upc)
+            incr('store_matches', store=self.name, result='match' if match else 'no_match')
+            if match is None or not match['price_text']:
+                return None
+            price_text, match_title = match['price_text'], match['title']
+            url = match.get('url') or url
+            price = self.normalize_price(price_text)
+            return {
+                'store': self.name,
+                'display_name': self.display_name,
+                'price_text': price_text,
+                # Integer cents (the low end of a range), or None if the text isn't a price
+                'price_cents': price.cents if price else None,
+                'currency': price.currency if price else None,
+                'url': url,
+                'match_title': match_title,
+                'confidence': confidence,
+            }
+        except Exception as e:
+            incr('errors', stage=f'{self.name}_search')
+            if isinstance(e, StoreSearchError):
+                raise
+            raise StoreSearchError(str(e)) from e
+
+
+class WalmartAdapter(StoreAdapter):
+    name = 'walmart'
+    display_name = 'Walmart'
+    search_url = 'https://www.walmart.com/search?q={query}'
+    referer = 'https://www.walmart.com/'
+
+    def parse(self, html):
+        # Prefers the embedded __NEXT_DATA__ JSON over the HTML
+        return parse_walmart_price(html)
+
+    def parse_candidates(self, html):
+        return parse_walmart_candidates(html)
+
+
+class TargetAdapter(StoreAdapter):
+    name = 'target'
+    display_name = 'Target'
+    search_url = 'https://www.target.com/s?searchTerm={query}'
+    referer = 'https://www.target.com/'
+    tile_selector = '[data-test="@web/site-top-of-funnel/ProductCardWrapper"]'
+    title_selectors = ['a[data-test="product-title"]']
+    price_selectors = [
+        'span[data-test="current-price"]',
+        '[data-test="product-price"]',
+    ]
+
+
+class BestBuyAdapter(StoreAdapter):
+    name = 'bestbuy'
+    display_name = 'Best Buy'
+    search_url = 'https://www.bestbuy.com/site/searchpage.jsp?st={query}'
+    referer = 'https://www.bestbuy.com/'
+    tile_selector = 'li.sku-item'
+    title_selectors = ['h4.sku-title a', '.sku-title a']
+    price_selectors = [
+        'div.priceView-customer-price span[aria-hidden="true"]',
+        'div.priceView-customer-price span',
+        '[data-testid="customer-price"] span',
+    ]
+
+
+STORES = {}
+
+
+def register_store(adapter):
+    """Add a store adapter to the comparison engine"""
+    STORES[adapter.name] = adapter
+    return adapter
+
+
+for _adapter in (WalmartAdapter(), TargetAdapter(), BestBuyAdapter()):
+    register_store(_adapter)
+
+
+def search_store(store_name, item_title, brand=None, model=None, upc=None):
+    """Search one registered store by name; raises StoreSearchError if it couldn't be searched"""
+    return STORES[store_name].search(item_title, brand=brand, model=model, upc=upc)
+
+
+def start_store_searches(item_title, stores=None, search=search_store, **identifiers):
+    """Start searching every store in the background
+
+    search(store_name, item_title, **identifiers) does the work, so callers
+    can put a cache in front of it. identifiers are the brand, model and upc
+    keywords of StoreAdapter.search. Returns {future: store name} for
+    collect_store_results.
+    """
+    names = stores or list(STORES)
+    return {submit_fetch(search, name, item_title, **identifiers): name for name in names}
+
+
+def collect_store_results(futures, min_results=None, timeout=DEFAULT_STORE_TIMEOUT):
+    """Wait for started store searches and return {store name: outcome}
+
+    The outcome is the result dict, None if the store has no match, or the
+    StoreSearchError of a store that couldn't be searched. Returns as soon
+    as min_results stores have found the product (all of them if
+    min_results is None), or when timeout seconds have passed; stores
+    still running then get a StoreTimeout and are left to finish in the
+    background.
+    """
+    results = {}
+    deadline = time.monotonic() + timeout
+    found = 0
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error searching {futures[future]}: {str(e)}")
+                result = e if isinstance(e, StoreSearchError) else StoreSearchError(str(e))
+            results[futures[future]] = result
+            if isinstance(result, dict):
+                found += 1
+        if min_results is not None and found >= min_results:
+            break
+
+    for future in pending:
+        incr('store_timeouts', store=futures[future])
+        results[futures[future]] = StoreTimeout(f"{futures[future]} was still searching")
+    # In the order the searches were started, not the order they finished
+    return {name: results[name] for name in futures.values()}
+
+
+def compare_stores(item_title, stores=None, min_results=None, timeout=DEFAULT_STORE_TIMEOUT, search=search_store,
+                   **identifiers):
+    """Search several stores in parallel and return {store name: outcome}, see collect_store_results"""
+    return collect_store_results(start_store_searches(item_title, stores, search, **identifiers), min_results, timeout)
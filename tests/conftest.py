@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules sit at the repo root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """A settable stand-in for time.time / time.monotonic"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
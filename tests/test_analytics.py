@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from analytics import (
+    daily_prices, days_since_low, deal_stats, drop_probability, percentile_rank, rolling_median, share_of_days,
+)
+from price_series import PriceSeries
+
+T0 = np.datetime64('2024-01-01T12:00', 's')
+DAY = np.timedelta64(1, 'D')
+
+
+@pytest.fixture
+def series():
+    # $10 for three days, $20 for two, then $15 until "now" on day 9
+    return PriceSeries([T0, T0 + 3 * DAY, T0 + 5 * DAY], [10.0, 20.0, 15.0])
+
+
+def test_daily_prices_hold_until_the_next_point(series):
+    assert daily_prices(series, now=T0 + 9 * DAY).tolist() == [10, 10, 10, 20, 20, 15, 15, 15, 15, 15]
+    assert set(daily_prices(series, days=3, now=T0 + 9 * DAY)) == {15}
+
+
+def test_daily_prices_of_a_product_first_seen_today():
+    assert daily_prices(PriceSeries([T0], [9.99]), now=T0).tolist() == [9.99]
+    assert len(daily_prices(PriceSeries([], []))) == 0
+
+
+def test_rolling_median():
+    assert rolling_median(np.array([1.0, 9.0, 2.0, 8.0]), window=3).tolist() == [2.0, 8.0]
+    # A history shorter than the window is one window
+    assert rolling_median(np.array([1.0, 9.0, 2.0]), window=90).tolist() == [2.0]
+
+
+def test_share_of_days_leaves_ties_out():
+    daily = np.array([10.0, 15.0, 15.0, 20.0])
+    assert share_of_days(daily, 15.0) == (25.0, 25.0)
+    assert percentile_rank(daily, 15.0) == 50.0
+    assert share_of_days(np.array([]), 15.0) == (None, None)
+
+
+def test_share_of_days_never_exceeds_the_whole():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        daily = rng.integers(1, 6, size=rng.integers(1, 50)).astype(float)
+        below, above = share_of_days(daily, float(rng.integers(0, 7)))
+        assert 0 <= below + above <= 100
+
+
+def test_days_since_low(series):
+    assert days_since_low(series, now=T0 + 9 * DAY) == 6.0
+    assert days_since_low(PriceSeries([T0, T0 + DAY], [20.0, 10.0]), now=T0 + 5 * DAY) == 0.0
+
+
+def test_drop_probability():
+    assert drop_probability(np.full(60, 10.0), 10.0) == 0.0
+    assert drop_probability(np.linspace(100.0, 60.0, 60), 80.0) == 1.0
+    # Too little history to judge a 30-day horizon
+    assert drop_probability(np.full(20, 10.0), 10.0) is None
+
+
+def test_deal_stats(series):
+    stats = deal_stats(series, now=T0 + 9 * DAY)
+    assert stats['typical_price'] == 15.0
+    assert stats['reference_price'] == 20.0
+    assert (stats['cheaper_share'], stats['pricier_share']) == (30.0, 20.0)
+    assert stats['percentile_rank'] == pytest.approx(55.0)
+    assert stats['days_since_low'] == 6.0 and not stats['at_low']
+    assert stats['days_analyzed'] == 10
+    assert deal_stats(PriceSeries([], [])) is None
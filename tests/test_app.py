@@ -0,0 +1,57 @@
+import os
+from types import SimpleNamespace
+
+import keepa
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import stores
+from benchmarks.fixtures import FakeKeepa
+from watchlist import DEFAULT_OWNER, PriceWatchScheduler, Watchlist
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+class Keepa(FakeKeepa):
+    def __init__(self, accesskey, **kwargs):
+        super().__init__(200)
+        self.accesskey = accesskey
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh session of the app, offline, with its SQLite files in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(keepa, 'Keepa', Keepa)
+    page = SimpleNamespace(status_code=200, text='<html></html>', headers={})
+    monkeypatch.setattr(stores, 'get_scraper_client', lambda: SimpleNamespace(get=lambda url, **kwargs: page))
+    # The background watcher isn't under test here
+    monkeypatch.setattr(PriceWatchScheduler, 'start', lambda self: self)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    def session():
+        at = AppTest.from_file(APP, default_timeout=30)
+        at.secrets['KEEPA_API_KEY'] = 'test-key'
+        return at.run()
+
+    yield session
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def sidebar_watchlist(at):
+    return [m.value for m in at.sidebar.markdown if 'Watchlist' in m.value]
+
+
+def test_watch_shows_up_in_a_fresh_session(app, tmp_path):
+    first = app()
+    assert sidebar_watchlist(first) == []
+    [t for t in first.text_input if t.label.startswith('Paste')][0].set_value('https://www.amazon.com/dp/B0BDHWDR12').run()
+    [b for b in first.button if 'Watch' in b.label][0].click().run()
+    assert not first.exception
+
+    # A reload or a new tab is a new session
+    assert sidebar_watchlist(app()) == ['## 👀 Watchlist (1)']
+    assert Watchlist('.girl_math_watchlist.sqlite').keepa_key(DEFAULT_OWNER) == 'test-key'
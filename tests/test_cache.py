@@ -0,0 +1,87 @@
+import pytest
+
+from cache import ACCESS_UPDATE_INTERVAL, MemoryProductCache, SQLiteProductCache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, clock):
+    def make(**kwargs):
+        if request.param == 'memory':
+            return MemoryProductCache(clock=clock, **kwargs)
+        return SQLiteProductCache(':memory:', clock=clock, **kwargs)
+    return make
+
+
+def test_keys_ignore_case_and_domain_is_separate(make_cache):
+    cache = make_cache()
+    cache.set('b0bdhwdr12 ', {'title': "Slippers"})
+    assert cache.get('B0BDHWDR12') == {'title': "Slippers"}
+    assert cache.get('B0BDHWDR12', domain='uk') is None
+
+
+def test_entries_expire_after_the_ttl(make_cache, clock):
+    cache = make_cache(ttl=100)
+    cache.set('B0BDHWDR12', 1)
+    clock.now = 100
+    assert cache.get('B0BDHWDR12') == 1
+    clock.now = 100.5
+    assert cache.get('B0BDHWDR12') is None
+    # Expired entries are dropped, not just hidden
+    assert len(cache) == 0
+
+
+def test_no_ttl_never_expires(make_cache, clock):
+    cache = make_cache(ttl=None)
+    cache.set('B0BDHWDR12', 1)
+    clock.now = 10 ** 9
+    assert cache.get('B0BDHWDR12') == 1
+
+
+def test_least_recently_used_is_evicted_first(make_cache, clock):
+    cache = make_cache(max_entries=3)
+    for asin in ['A', 'B', 'C']:
+        cache.set(asin, asin)
+        clock.now += ACCESS_UPDATE_INTERVAL + 1
+    # Reading A makes B the least recently used
+    assert cache.get('A') == 'A'
+    clock.now += ACCESS_UPDATE_INTERVAL + 1
+    cache.set('D', 'D')
+    clock.now += ACCESS_UPDATE_INTERVAL + 1
+    cache.set('E', 'E')
+    assert len(cache) == 3
+    assert [cache.get(asin) for asin in 'ABCDE'] == ['A', None, None, 'D', 'E']
+
+
+def test_sqlite_trims_to_max_entries(clock):
+    cache = SQLiteProductCache(':memory:', max_entries=5, clock=clock)
+    for i in range(20):
+        cache.set(f'B{i:09d}', i)
+        clock.now += 1
+    assert len(cache) == 5
+    assert [cache.get(f'B{i:09d}') for i in range(15, 20)] == list(range(15, 20))
+    # Replacing an entry doesn't count twice
+    cache.set('B000000019', 'new')
+    assert len(cache) == 5
+
+
+def accessed_at(cache, asin):
+    return cache._conn.execute(
+        "SELECT accessed_at FROM product_cache WHERE asin = ?", (asin,)
+    ).fetchone()[0]
+
+
+def test_sqlite_hits_only_write_once_access_is_stale(clock):
+    cache = SQLiteProductCache(':memory:', clock=clock)
+    cache.set('B0BDHWDR12', 1)
+    changes = cache._conn.total_changes
+
+    clock.now = ACCESS_UPDATE_INTERVAL
+    for _ in range(10):
+        assert cache.get('B0BDHWDR12') == 1
+    assert cache._conn.total_changes == changes
+    assert accessed_at(cache, 'B0BDHWDR12') == 0
+
+    clock.now = ACCESS_UPDATE_INTERVAL + 1
+    assert cache.get('B0BDHWDR12') == 1
+    assert cache._conn.total_changes == changes + 1
+    assert accessed_at(cache, 'B0BDHWDR12') == ACCESS_UPDATE_INTERVAL + 1
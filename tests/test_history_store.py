@@ -0,0 +1,103 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from history_store import SYNC_OVERLAP_DAYS, PriceHistoryStore
+
+ASIN = 'B0BDHWDR12'
+START = datetime(2024, 1, 1)
+DAY = 86400
+
+
+class FakeApi:
+    """Answers every query with the points it currently holds, recording the kwargs"""
+
+    def __init__(self, points, **product):
+        self.points = dict(points)
+        self.product = product
+        self.queries = []
+
+    def query(self, asin, **kwargs):
+        self.queries.append(kwargs)
+        times = sorted(self.points)
+        data = {'NEW': [self.points[t] for t in times], 'NEW_time': [START + timedelta(days=t) for t in times]}
+        return [{'asin': asin, 'title': "Pink Fluffy Slippers", 'data': data, **self.product}]
+
+
+def epoch(day):
+    return (START + timedelta(days=day) - datetime(1970, 1, 1)).total_seconds()
+
+
+@pytest.fixture
+def store(clock):
+    clock.now = epoch(10)
+    return PriceHistoryStore(':memory:', min_sync_interval=3600, clock=clock)
+
+
+def test_first_sync_pulls_the_full_history(store):
+    api = FakeApi({0: 30.0, 5: 25.0, 9: 20.0})
+    title, series = store.sync(api, ASIN)
+    assert api.queries == [{'domain': 'US'}]
+    assert title == "Pink Fluffy Slippers"
+    assert series.prices.tolist() == [30.0, 25.0, 20.0]
+
+
+def test_no_query_inside_the_sync_interval(store, clock):
+    api = FakeApi({0: 30.0, 9: 20.0})
+    store.sync(api, ASIN)
+    clock.now += 3599
+    title, series = store.sync(api, ASIN)
+    assert len(api.queries) == 1
+    assert title == "Pink Fluffy Slippers"
+    assert series.prices.tolist() == [30.0, 20.0]
+
+
+def test_later_syncs_ask_only_for_the_days_since_the_newest_point(store, clock):
+    api = FakeApi({0: 30.0, 9: 20.0})
+    store.sync(api, ASIN)
+    # Forced inside the interval: the newest point is a day old
+    store.sync(api, ASIN, force=True)
+    assert api.queries[1] == {'domain': 'US', 'days': 1 + SYNC_OVERLAP_DAYS}
+    clock.now = epoch(12.5)
+    store.sync(api, ASIN)
+    assert api.queries[2] == {'domain': 'US', 'days': 4 + SYNC_OVERLAP_DAYS}
+
+
+def test_points_backfilled_inside_the_overlap_are_kept(store, clock):
+    api = FakeApi({0: 30.0, 9: 20.0})
+    store.sync(api, ASIN)
+    # Keepa added a point older than the newest one we had, and a new one
+    api.points.update({8.5: 22.0, 10: 19.0})
+    clock.now = epoch(10.5)
+    _, series = store.sync(api, ASIN, force=True)
+    assert series.prices.tolist() == [30.0, 22.0, 20.0, 19.0]
+    assert store.product(ASIN)[1] == epoch(10)
+
+
+def test_identifiers_persist(store, clock):
+    api = FakeApi({0: 30.0}, brand='Fluffy Co', model='PF-8', upcList=['012345678905'])
+    store.sync(api, ASIN)
+    assert store.identifiers(ASIN) == {'brand': 'Fluffy Co', 'model': 'PF-8', 'upc': '012345678905'}
+    # A later answer without them doesn't wipe them out
+    api.product = {}
+    store.sync(api, ASIN, force=True)
+    assert store.identifiers(ASIN) == {'brand': 'Fluffy Co', 'model': 'PF-8', 'upc': '012345678905'}
+    assert store.identifiers('B000000000') == {}
+
+
+def test_old_stores_are_rescaled_to_dollars(tmp_path):
+    # Stores written before prices were read as keepa's dollars held them / 100
+    path = str(tmp_path / 'history.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE price_points (asin TEXT NOT NULL, domain TEXT NOT NULL, ts INTEGER NOT NULL, "
+        "price REAL NOT NULL, PRIMARY KEY (asin, domain, ts)) WITHOUT ROWID"
+    )
+    conn.execute("INSERT INTO price_points VALUES ('B0BDHWDR12', 'US', 0, 0.312)")
+    conn.commit()
+    conn.close()
+
+    assert PriceHistoryStore(path).load('B0BDHWDR12').prices.tolist() == [31.2]
+    # Only once
+    assert PriceHistoryStore(path).load('B0BDHWDR12').prices.tolist() == [31.2]
@@ -0,0 +1,99 @@
+import pytest
+
+from matching import MIN_CONFIDENCE, analyze, best_match, keepa_identifiers, rank_candidates
+
+SLIPPERS = "Pink Fluffy Slippers for Women, Memory Foam House Shoes, Size 8"
+
+
+def test_analyze_joins_sizes_and_finds_models():
+    analyzed = analyze("Sony WH1000XM5 Headphones 1.5 L 12-pack 2nd Gen")
+    assert {'1.5l', '12pack', '2nd'} <= analyzed.variants
+    assert analyzed.models == {'wh1000xm5'}
+    assert 'the' not in analyze("The Headphones").tokens
+
+
+def test_exact_title_wins():
+    candidates = [
+        {'title': "Slipper Socks Case"},
+        {'title': "Pink Fluffy Slippers for Women Memory Foam"},
+        {'title': "Blue Running Shoes"},
+    ]
+    match, confidence = best_match(SLIPPERS, candidates)
+    assert match is candidates[1]
+    assert confidence >= MIN_CONFIDENCE
+
+
+def test_upc_match_is_certain():
+    candidates = [{'title': "Completely different words", 'upc': '0012345678905'}]
+    assert best_match(SLIPPERS, candidates, upc='12345678905') == (candidates[0], 1.0)
+
+
+def test_accessory_for_the_product_is_not_a_match():
+    title = "Apple AirPods Pro (2nd Generation) Wireless Earbuds"
+    accessory = {'title': "Silicone Case Cover for Apple AirPods Pro 2nd Generation"}
+    product = {'title': "Apple AirPods Pro 2nd Generation Wireless Earbuds"}
+    assert rank_candidates(title, [accessory, product])[0][1] is product
+    # Alone on the page it still isn't shown as the product's price
+    assert best_match(title, [accessory])[0] is None
+
+
+def test_other_size_is_penalized():
+    title = "Tide Liquid Laundry Detergent 92 fl oz"
+    same = {'title': "Tide Liquid Laundry Detergent, 92 fl oz"}
+    other = {'title': "Tide Liquid Laundry Detergent, 46 fl oz"}
+    (best, best_candidate), (worse, _) = rank_candidates(title, [other, same])
+    assert best_candidate is same
+    assert worse < best
+
+
+def test_sibling_model_is_penalized():
+    title = "Sony WH1000XM5 Wireless Noise Canceling Headphones"
+    sibling = {'title': "Sony WH1000XM4 Wireless Noise Canceling Headphones"}
+    same = {'title': "Sony WH1000XM5 Wireless Noise Canceling Headphones"}
+    assert rank_candidates(title, [sibling, same])[0][1] is same
+
+
+def test_wrong_brand_is_penalized():
+    title = "Wireless Mouse Ergonomic"
+    ours = {'title': "Wireless Mouse Ergonomic", 'brand': "Logitech"}
+    theirs = {'title': "Wireless Mouse Ergonomic", 'brand': "Generic"}
+    ranked = rank_candidates(title, [theirs, ours], brand="Logitech")
+    assert ranked[0][1] is ours
+    assert ranked[1][0] < ranked[0][0]
+
+
+@pytest.mark.parametrize('candidate_brand', ["Apple Inc.", "APPLE", "Apple Computer"])
+def test_brand_written_differently_still_matches(candidate_brand):
+    candidates = [{'title': "Apple AirPods Pro 2nd Generation with USB-C", 'brand': candidate_brand}]
+    match, confidence = best_match("Apple AirPods Pro (2nd Generation) Wireless Earbuds", candidates, brand="Apple")
+    assert match is candidates[0]
+
+
+def test_company_suffix_alone_is_not_the_same_brand():
+    ours = {'title': "Wireless Mouse Ergonomic", 'brand': "Logitech Inc."}
+    theirs = {'title': "Wireless Mouse Ergonomic", 'brand': "Generic Inc."}
+    ranked = rank_candidates("Wireless Mouse Ergonomic", [theirs, ours], brand="Logitech Inc.")
+    assert ranked[0][1] is ours
+    assert ranked[1][0] < ranked[0][0]
+
+
+def test_equal_scores_keep_page_order():
+    candidates = [{'title': "Pink Fluffy Slippers"}, {'title': "Pink Fluffy Slippers"}]
+    assert [c for _, c in rank_candidates("Pink Fluffy Slippers", candidates)] == candidates
+
+
+@pytest.mark.parametrize('candidates', [[], [{'title': ''}, {'price_text': '$1.00'}]])
+def test_no_candidates(candidates):
+    assert best_match(SLIPPERS, candidates) == (None, 0.0)
+
+
+def test_no_confident_match():
+    match, confidence = best_match(SLIPPERS, [{'title': "Cordless Drill 20V"}])
+    assert match is None
+    assert confidence < MIN_CONFIDENCE
+
+
+def test_keepa_identifiers_skips_unknowns():
+    product = {'brand': "Acme", 'model': None, 'partNumber': "X-100", 'upcList': None, 'eanList': ['4006381333931']}
+    assert keepa_identifiers(product) == {'brand': "Acme", 'model': "X-100", 'upc': '4006381333931'}
+    assert keepa_identifiers({'brand': ''}) == {}
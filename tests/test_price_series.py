@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from price_series import PriceSeries, minmax_downsample
+
+
+def test_short_series_are_kept_whole():
+    assert minmax_downsample([3.0, 1.0, 2.0], max_points=10).tolist() == [0, 1, 2]
+    assert minmax_downsample([], max_points=10).tolist() == []
+
+
+def test_tiny_budget_keeps_the_ends():
+    assert minmax_downsample(np.arange(100.0), max_points=3).tolist() == [0, 99]
+
+
+@pytest.mark.parametrize('n, max_points', [(1001, 1000), (5000, 1000), (12345, 100), (50, 4), (999, 7)])
+def test_downsample_keeps_shape(n, max_points):
+    prices = np.random.default_rng(n).normal(50, 10, n)
+    keep = minmax_downsample(prices, max_points)
+    assert len(keep) <= max_points
+    assert keep.tolist() == sorted(set(keep.tolist()))
+    assert keep[0] == 0 and keep[-1] == n - 1
+    kept = prices[keep]
+    assert kept.max() == prices.max() and kept.min() == prices.min()
+
+
+def test_series_downsample():
+    times = np.datetime64('2024-01-01', 's') + np.arange(3000) * np.timedelta64(1, 'h')
+    prices = np.sin(np.arange(3000) / 50) + 20
+    series = PriceSeries(times, prices)
+    small = series.downsample(500)
+    assert len(small) <= 500
+    assert small.current_price == series.current_price
+    assert (small.peak_price, small.lowest_price) == (series.peak_price, series.lowest_price)
+    assert np.all(np.diff(small.times) > np.timedelta64(0, 's'))
+    assert series.downsample(5000) is series
+
+
+def test_from_keepa_keeps_keepa_dollars():
+    # keepa.Keepa.query has already divided by 100 and turned out of stock into NaN
+    times = np.array(['2024-01-01T00:00', '2024-01-02T00:00', '2024-01-03T00:00'], dtype='datetime64[m]')
+    product = {'data': {'NEW': np.array([31.2, np.nan, 29.99]), 'NEW_time': times.astype(datetime)}}
+    series = PriceSeries.from_keepa(product)
+    assert series.prices.tolist() == [31.2, 29.99]
+    assert series.times.tolist() == [datetime(2024, 1, 1), datetime(2024, 1, 3)]
+
+
+def test_from_raw_scales_keepa_cents():
+    series = PriceSeries.from_raw(np.array([0, 60], dtype='datetime64[s]'), [3120, -1])
+    assert series.prices.tolist() == [31.2]
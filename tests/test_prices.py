@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from prices import MISSING_CENTS, Price, format_cents, parse_cents, parse_price
+
+CURRENCIES = ['USD', 'CAD', 'AUD', 'EUR', 'GBP', 'JPY']
+
+
+def random_cents(rng):
+    # Spread over every magnitude, so thousands separators get exercised
+    return rng.randrange(10 ** rng.randint(1, 11))
+
+
+def test_format_cents_round_trips():
+    rng = random.Random(17)
+    for _ in range(5000):
+        cents, currency = random_cents(rng), rng.choice(CURRENCIES)
+        text = format_cents(cents, currency)
+        assert parse_price(text) == Price(cents, currency, None, None, None), text
+
+
+def test_decimal_comma_round_trips():
+    rng = random.Random(18)
+    for _ in range(2000):
+        cents = random_cents(rng)
+        text = f"{cents // 100:,}".replace(',', '.') + f",{cents % 100:02d} €"
+        assert parse_price(text) == Price(cents, 'EUR', None, None, None), text
+
+
+def test_range_round_trips():
+    rng = random.Random(19)
+    for _ in range(2000):
+        low = random_cents(rng)
+        high = low + random_cents(rng)
+        separator = rng.choice([' - ', '-', ' – ', ' to '])
+        text = format_cents(low) + separator + format_cents(high)
+        price = parse_price(text)
+        assert (price.cents, price.high_cents) == (low, high), text
+
+
+def test_unit_price_round_trips():
+    rng = random.Random(20)
+    for _ in range(2000):
+        cents, unit_cents = random_cents(rng), rng.randrange(10000)
+        unit = rng.choice(['oz', 'fl oz', 'count', 'lb'])
+        text = f"{format_cents(cents)} ({format_cents(unit_cents)}/{unit})"
+        assert parse_price(text) == Price(cents, 'USD', None, unit_cents, unit), text
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('$12.97', Price(1297, 'USD', None, None, None)),
+    ('$12', Price(1200, 'USD', None, None, None)),
+    ('$1,299.00', Price(129900, 'USD', None, None, None)),
+    ('99¢', Price(99, 'USD', None, None, None)),
+    ('12,99 €', Price(1299, 'EUR', None, None, None)),
+    ('1.299,00 €', Price(129900, 'EUR', None, None, None)),
+    ('1.299 €', Price(129900, 'EUR', None, None, None)),
+    ('EUR 5,49', Price(549, 'EUR', None, None, None)),
+    ('£8.50', Price(850, 'GBP', None, None, None)),
+    ('C$19.99', Price(1999, 'CAD', None, None, None)),
+    ('$12.97 - $24.99', Price(1297, 'USD', 2499, None, None)),
+    ('$12.97 to $24.99', Price(1297, 'USD', 2499, None, None)),
+    ('$5.98 ($0.25/oz)', Price(598, 'USD', None, 25, 'oz')),
+    ('($0.545/fl oz) $5.98', Price(598, 'USD', None, 55, 'fl oz')),
+    ('$12.97/ea', Price(1297, 'USD', None, None, None)),
+    ('Now $9.99, was $14.99', Price(999, 'USD', None, None, None)),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+
+@pytest.mark.parametrize('text', [None, '', 'Out of stock', 'Pack of 12', 'Size 8'])
+def test_parse_price_without_a_price(text):
+    assert parse_price(text) is None
+
+
+def test_bare_dollar_uses_default_currency():
+    assert parse_price('$3.00', 'CAD').currency == 'CAD'
+
+
+def test_parse_cents():
+    cents = parse_cents(['$1.00', None, 'n/a', '$1.00', '2,50 €'])
+    assert cents.tolist() == [100, MISSING_CENTS, MISSING_CENTS, 100, 250]
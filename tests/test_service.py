@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+import service
+from benchmarks.fixtures import FakeKeepa
+from cache import MemoryProductCache
+from service import FairShareLimiter, KeepaBudgetExceeded, LookupService
+from stores import StoreSearchError
+
+
+def test_user_alone_gets_the_whole_budget(clock):
+    limiter = FairShareLimiter(20, clock=clock)
+    assert limiter.grant('a', 200) == 20
+    with pytest.raises(KeepaBudgetExceeded) as e:
+        limiter.acquire('a')
+    assert e.value.retry_after == 60
+    clock.now = 61
+    limiter.acquire('a', 20)
+
+
+def test_acquire_is_all_or_nothing(clock):
+    limiter = FairShareLimiter(20, clock=clock)
+    with pytest.raises(KeepaBudgetExceeded):
+        limiter.acquire('a', 21)
+    assert limiter.grant('a', 20) == 20
+
+
+def test_active_users_split_the_budget(clock):
+    limiter = FairShareLimiter(20, clock=clock)
+    limiter.acquire('a')
+    clock.now = 1
+    # b's arrival halves a's share to 10, of which a has 9 left
+    assert limiter.grant('b', 15) == 10
+    assert limiter.grant('a', 15) == 9
+    with pytest.raises(KeepaBudgetExceeded) as e:
+        limiter.acquire('b')
+    assert e.value.user == 'b'
+    # b waits for its own spending, at t=1, to leave the window
+    assert e.value.retry_after == 60
+
+
+def test_budget_is_never_overspent(clock):
+    limiter = FairShareLimiter(20, clock=clock)
+    granted = 0
+    for step in range(200):
+        clock.now = step * 0.1
+        try:
+            granted += limiter.grant(f'user{step % 7}', step % 13 + 1)
+        except KeepaBudgetExceeded:
+            pass
+        assert limiter._total <= limiter.budget
+    assert granted > 0
+
+
+def test_more_users_than_tokens_still_get_through(clock):
+    limiter = FairShareLimiter(3, clock=clock)
+    for user in 'abcde':
+        try:
+            limiter.acquire(user)
+        except KeepaBudgetExceeded:
+            pass
+    assert limiter._total == 3
+
+
+def product(asin):
+    return {'title': asin, 'current_price': 1.0, 'peak_price': 2.0, 'lowest_price': 1.0}
+
+
+def test_concurrent_lookups_share_one_query():
+    class SlowKeepa(FakeKeepa):
+        def query(self, *args, **kwargs):
+            time.sleep(0.1)
+            return super().query(*args, **kwargs)
+
+    api = SlowKeepa(100)
+    lookups = LookupService(MemoryProductCache())
+    results = []
+    threads = [
+        threading.Thread(target=lambda user=user: results.append(lookups.product_info(api, 'B0BDHWDR12', user=user)))
+        for user in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert api.queries == 1
+    assert len(results) == 10 and all(result is results[0] for result in results)
+
+
+def test_products_info_charges_only_misses_and_yields_what_fits():
+    api = FakeKeepa(100)
+    cache = MemoryProductCache()
+    cache.set('CACHED0001', product('CACHED0001'))
+    lookups = LookupService(cache)
+    lookups.limiter(api).budget = 5
+
+    seen = []
+    with pytest.raises(KeepaBudgetExceeded):
+        for asin, info in lookups.products_info(api, ['CACHED0001'] + [f'B00000000{i}' for i in range(8)], user='u'):
+            seen.append(asin)
+    assert seen == ['CACHED0001'] + [f'B00000000{i}' for i in range(5)]
+    assert api.queries == 1
+
+
+def test_store_no_match_is_cached_but_errors_only_briefly(monkeypatch, clock):
+    calls = []
+
+    def search_store(store_name, item_title, **identifiers):
+        calls.append(store_name)
+        if store_name == 'target':
+            raise StoreSearchError("Target answered 429")
+        return None
+
+    monkeypatch.setattr(service, 'search_store', search_store)
+    lookups = LookupService(MemoryProductCache())
+    lookups.store_results.clock = lookups.store_errors.clock = clock
+
+    for _ in range(2):
+        assert lookups.store_result('walmart', 'Slippers') is None
+        with pytest.raises(StoreSearchError):
+            lookups.store_result('target', 'Slippers')
+    assert calls == ['walmart', 'target']
+
+    clock.now = service.STORE_ERROR_TTL + 1
+    assert lookups.store_result('walmart', 'Slippers') is None
+    with pytest.raises(StoreSearchError):
+        lookups.store_result('target', 'Slippers')
+    assert calls == ['walmart', 'target', 'target']
+
+
+def test_clear_store_results_for_one_product(monkeypatch):
+    monkeypatch.setattr(service, 'search_store', lambda store_name, item_title, **identifiers: {'title': item_title})
+    lookups = LookupService(MemoryProductCache())
+    lookups.store_result('walmart', 'Slippers', brand='Acme')
+    lookups.store_result('walmart', 'Socks')
+    lookups.clear_store_results('Slippers', brand='Acme')
+    assert len(lookups.store_results) == 1
+    lookups.clear_store_results()
+    assert len(lookups.store_results) == 0
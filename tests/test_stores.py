@@ -0,0 +1,123 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import stores
+from benchmarks.fixtures import WALMART_PRODUCTS, bestbuy_search_page, target_search_page, walmart_search_page
+from components import store_card
+from fetch import submit_fetch
+from matching import MIN_CONFIDENCE
+from prices import parse_price
+from stores import STORES, StoreSearchError, StoreTimeout, collect_store_results
+
+
+def result(store, price_cents=1297):
+    return {
+        'store': store, 'display_name': store.title(), 'price_text': '$12.97', 'price_cents': price_cents,
+        'currency': 'USD', 'url': f'https://{store}.example/item', 'match_title': 'Slippers', 'confidence': 0.9,
+    }
+
+
+def fail():
+    raise StoreSearchError("Target answered 429")
+
+
+def test_collect_tells_failures_and_stragglers_from_no_match():
+    release = threading.Event()
+    futures = {
+        submit_fetch(lambda: result('walmart')): 'walmart',
+        submit_fetch(fail): 'target',
+        submit_fetch(lambda: None): 'bestbuy',
+        submit_fetch(release.wait, 5): 'slowmart',
+    }
+    try:
+        results = collect_store_results(futures, timeout=0.5)
+    finally:
+        release.set()
+    assert list(results) == ['walmart', 'target', 'bestbuy', 'slowmart']
+    assert results['walmart']['price_cents'] == 1297
+    assert isinstance(results['target'], StoreSearchError) and not isinstance(results['target'], StoreTimeout)
+    assert results['bestbuy'] is None
+    assert isinstance(results['slowmart'], StoreTimeout)
+
+
+def test_collect_returns_once_enough_stores_found_it():
+    release = threading.Event()
+    futures = {submit_fetch(lambda: result('walmart')): 'walmart', submit_fetch(release.wait, 5): 'target'}
+    try:
+        results = collect_store_results(futures, min_results=1, timeout=5)
+    finally:
+        release.set()
+    assert results['walmart'] is not None
+    assert isinstance(results['target'], StoreTimeout)
+
+
+def test_store_card_outcomes():
+    assert "You'd save <b>$7.03</b>" in store_card("Walmart", result('walmart'), 20.00)
+    assert "Couldn't find this product on Target" in store_card("Target", None, 20.00)
+    assert "Couldn't check Target right now" in store_card("Target", StoreSearchError("429"), 20.00)
+    assert "Still checking Target" in store_card("Target", StoreTimeout("slow"), 20.00)
+
+
+PAGES = {
+    'walmart': lambda: walmart_search_page(items=8, noise_blocks=20),
+    'walmart (html only)': lambda: walmart_search_page(items=8, noise_blocks=20, next_data=False),
+    'target': lambda: target_search_page(items=8, noise_blocks=20),
+    'bestbuy': lambda: bestbuy_search_page(items=8, noise_blocks=20),
+}
+
+
+def adapter_for(page_name, page, monkeypatch):
+    adapter = STORES[page_name.split()[0]]
+    monkeypatch.setattr(adapter, 'fetch', lambda url: page)
+    return adapter
+
+
+@pytest.mark.parametrize('page_name', PAGES)
+def test_adapter_reads_every_tile(page_name, monkeypatch):
+    page = PAGES[page_name]()
+    candidates = adapter_for(page_name, page, monkeypatch).parse_candidates(page)
+    assert len(candidates) == 8
+    assert {(c['title'], parse_price(c['price_text']).cents) for c in candidates} == {
+        (name, round(price * 100)) for name, price in WALMART_PRODUCTS
+    }
+
+
+@pytest.mark.parametrize('page_name', PAGES)
+def test_adapter_finds_the_matching_product(page_name, monkeypatch):
+    adapter = adapter_for(page_name, PAGES[page_name](), monkeypatch)
+    found = adapter.search("Stanley Quencher H2.0 FlowState Tumbler 40 oz, Rose Quartz")
+    assert found['store'] == adapter.name
+    assert found['match_title'] == "Stanley Quencher H2.0 Tumbler 40 oz Rose Quartz"
+    assert (found['price_cents'], found['currency']) == (4500, 'USD')
+    assert found['confidence'] >= MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize('page_name', PAGES)
+def test_adapter_without_a_match(page_name, monkeypatch):
+    adapter = adapter_for(page_name, PAGES[page_name](), monkeypatch)
+    assert adapter.search("Cordless Drill Driver Kit 20V") is None
+
+
+@pytest.mark.parametrize('name', ['walmart', 'target', 'bestbuy'])
+def test_adapter_on_pages_without_results(name, monkeypatch):
+    adapter = adapter_for(name, '<html><body><p>No results for "zzz"</p></body></html>', monkeypatch)
+    assert adapter.search("Stanley Quencher Tumbler") is None
+
+
+@pytest.mark.parametrize('name', ['target', 'bestbuy'])
+def test_adapter_on_a_layout_it_cant_read(name, monkeypatch):
+    # Prices on the page but the tile markup changed: never show the first price
+    page = PAGES[name]().replace('ProductCardWrapper', 'ProductCard').replace('sku-item', 'sku-card')
+    adapter = adapter_for(name, page, monkeypatch)
+    with pytest.raises(StoreSearchError):
+        adapter.search("Stanley Quencher H2.0 Tumbler 40 oz")
+
+
+@pytest.mark.parametrize('name', ['walmart', 'target', 'bestbuy'])
+def test_adapter_on_an_error_response(name, monkeypatch):
+    client = SimpleNamespace(get=lambda url, **kwargs: SimpleNamespace(status_code=429, text='Too many requests'))
+    monkeypatch.setattr(stores, 'get_scraper_client', lambda: client)
+    with pytest.raises(StoreSearchError, match='429'):
+        STORES[name].search("Stanley Quencher Tumbler")
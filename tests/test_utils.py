@@ -0,0 +1,89 @@
+import pytest
+
+import utils
+from benchmarks.fixtures import AMAZON_URLS
+from utils import extract_asin, extract_asins
+
+ASIN = 'B0BDHWDR12'
+
+
+@pytest.mark.parametrize('path', [
+    '/dp/', '/dp/product/', '/gp/product/', '/gp/aw/d/', '/gp/offer-listing/',
+    '/product-reviews/', '/ASIN/', '/o/ASIN/', '/exec/obidos/ASIN/',
+])
+def test_path_markers(path):
+    assert extract_asin(f'https://www.amazon.com{path}{ASIN}', resolve_short_links=False) == ASIN
+    assert extract_asin(f'https://www.amazon.com/Some-Slug{path}{ASIN}/ref=sr_1_1?th=1',
+                        resolve_short_links=False) == ASIN
+
+
+@pytest.mark.parametrize('domain', ['amazon.com', 'amazon.ca', 'amazon.co.uk', 'amazon.de',
+                                    'amazon.co.jp', 'amazon.com.au', 'smile.amazon.com'])
+def test_country_domains(domain):
+    assert extract_asin(f'https://{domain}/dp/{ASIN}', resolve_short_links=False) == ASIN
+    assert extract_asin(f'{domain}/dp/{ASIN}?psc=1', resolve_short_links=False) == ASIN
+
+
+@pytest.mark.parametrize('url', AMAZON_URLS)
+def test_real_product_urls(url):
+    assert extract_asin(url, resolve_short_links=False) is not None
+
+
+@pytest.mark.parametrize('url, asin', [
+    # Slug-only links, with nothing but the ASIN's shape to go on
+    (f'https://www.amazon.com/Some-Name/{ASIN}', ASIN),
+    (f'amazon.com/Some-Name/{ASIN}/ref=sr_1_1', ASIN),
+    (f'amazon.com/Some-Name/{ASIN}?th=1', ASIN),
+    (f'amazon.com/Some-Name/{ASIN}#reviews', ASIN),
+    ('https://www.amazon.com/Catcher-Rye-J-D-Salinger/0316769487', '0316769487'),
+    ('https://www.amazon.com/Some-Book/031676948X/', '031676948X'),
+    # Lowercase ASINs come back uppercased
+    ('https://www.amazon.com/dp/b0bdhwdr12', ASIN),
+    ('amazon.com/some-name/b0bdhwdr12', ASIN),
+    ('/dp/b0bdhwdr12', ASIN),
+])
+def test_extract_asin(url, asin):
+    assert extract_asin(url, resolve_short_links=False) == asin
+
+
+@pytest.mark.parametrize('url', [
+    # Lookalike hosts
+    f'https://notamazon.com/dp/{ASIN}',
+    f'https://www.notamazon.com/Some-Name/{ASIN}',
+    f'https://evil.com/amazon.com/dp/{ASIN}',
+    f'https://evil.com/dp/{ASIN}',
+    f'https://amazon.com.evil.com/{ASIN}',
+    # 11-character IDs
+    f'https://www.amazon.com/dp/{ASIN}3',
+    f'https://www.amazon.com/Some-Name/{ASIN}3',
+    # Slug words that happen to be ten characters long
+    'https://www.amazon.com/Headphones/s?k=pink',
+    'https://www.amazon.com/Bestseller/zgbs',
+])
+def test_rejects(url):
+    assert extract_asin(url, resolve_short_links=False) is None
+
+
+def test_extract_asins_from_prose(monkeypatch):
+    resolved = []
+
+    def resolve(url):
+        resolved.append(url)
+        return 'B00SHORT01'
+
+    monkeypatch.setattr(utils, 'resolve_short_link', resolve)
+    monkeypatch.setattr(utils, '_short_links', {})
+    text = (
+        f"Okay so these slippers (https://www.amazon.com/dp/{ASIN}). Are they worth it?\n"
+        "Also amazon.co.uk/gp/product/b07fz8s74r, and the tumbler: "
+        "https://www.amazon.com/Stanley-Quencher/dp/B0CJZMP7L1?th=1!\n"
+        "Reviews at amazon.com/product-reviews/B00X4WHP5E/ref=cm_cr; my friend sent "
+        "https://amzn.to/3xYzAbC. Not this one: https://notamazon.com/dp/B0AAAAAAAA, "
+        f"nor https://www.amazon.com/dp/{ASIN}9."
+    )
+    assert extract_asins(text) == [ASIN, 'B07FZ8S74R', 'B0CJZMP7L1', 'B00X4WHP5E', 'B00SHORT01']
+    assert resolved == ['https://amzn.to/3xYzAbC']
+
+    resolved.clear()
+    assert extract_asins(text, resolve_short_links=False) == [ASIN, 'B07FZ8S74R', 'B0CJZMP7L1', 'B00X4WHP5E']
+    assert resolved == []
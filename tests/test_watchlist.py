@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fixtures import FakeKeepa
+from cache import MemoryProductCache
+from service import LookupService
+from watchlist import AT_LOWEST_PRICE, BELOW_THRESHOLD, WATCHER_USER, PriceWatchScheduler, Watchlist, check_alerts
+
+
+@pytest.mark.parametrize('watch, current, lowest, expected', [
+    # Already under the threshold the first time we look
+    ({'threshold': 20.0}, 18.0, 10.0, [BELOW_THRESHOLD]),
+    # Crossing it
+    ({'threshold': 20.0, 'last_price': 25.0, 'last_alert': 'x'}, 19.99, 10.0, [BELOW_THRESHOLD]),
+    # Staying under it after the alert fired
+    ({'threshold': 20.0, 'last_price': 19.0, 'last_alert': f'{BELOW_THRESHOLD}:19.00'}, 18.0, 10.0, []),
+    # Exactly at the threshold counts
+    ({'threshold': 20.0}, 20.0, 10.0, [BELOW_THRESHOLD]),
+    ({'threshold': 20.0}, 20.01, 10.0, []),
+    ({'threshold': None}, 1.0, 10.0, []),
+    # A new low fires once per price
+    ({'notify_on_low': 1}, 10.0, 10.0, [AT_LOWEST_PRICE]),
+    ({'notify_on_low': 1, 'last_alert': f'{AT_LOWEST_PRICE}:10.00'}, 10.0, 10.0, []),
+    ({'notify_on_low': 1, 'last_alert': f'{AT_LOWEST_PRICE}:10.00'}, 9.5, 9.5, [AT_LOWEST_PRICE]),
+    ({'notify_on_low': 0}, 10.0, 10.0, []),
+    ({'notify_on_low': 1, 'threshold': 20.0}, 10.0, 10.0, [BELOW_THRESHOLD, AT_LOWEST_PRICE]),
+])
+def test_check_alerts(watch, current, lowest, expected):
+    assert check_alerts(watch, current, lowest) == expected
+
+
+@pytest.fixture
+def watchlist(clock):
+    return Watchlist(':memory:', clock=clock)
+
+
+@pytest.mark.parametrize('tokens_left, status, expected', [
+    (None, None, 500),
+    # keepa.Keepa reports 0 tokens left until Keepa first answers
+    (0, SimpleNamespace(tokensLeft=None), 500),
+    (0, SimpleNamespace(tokensLeft=0), 0),
+    (-50, SimpleNamespace(tokensLeft=-50), 0),
+    (120, SimpleNamespace(tokensLeft=120), 100),
+    (10000, SimpleNamespace(tokensLeft=10000), 500),
+])
+def test_poll_budget(watchlist, tokens_left, status, expected):
+    api = SimpleNamespace(tokens_left=tokens_left)
+    if status is not None:
+        api.status = status
+    assert PriceWatchScheduler(api, watchlist).poll_budget() == expected
+
+
+def test_tick_polls_each_owner_on_their_stored_key(watchlist, clock):
+    clients = {'alice-key': FakeKeepa(50), 'bob-key': FakeKeepa(50)}
+    watchlist.add('B000000001', threshold=1e9, owner='alice')
+    watchlist.add('B000000002', threshold=1e9, owner='bob')
+    watchlist.set_keepa_key('alice', 'alice-key')
+    watchlist.set_keepa_key('bob', 'bob-key')
+    # Nobody has the app open: the keys alone get the watches polled
+    scheduler = PriceWatchScheduler(None, watchlist, clock=clock, client_factory=clients.get)
+
+    events = scheduler.tick()
+    assert sorted((event['owner'], event['asin'], event['kind']) for event in events) == [
+        ('alice', 'B000000001', BELOW_THRESHOLD), ('bob', 'B000000002', BELOW_THRESHOLD),
+    ]
+    assert (clients['alice-key'].queries, clients['bob-key'].queries) == (1, 1)
+    assert [event['asin'] for event in watchlist.events(owner='alice')] == ['B000000001']
+
+    # Rescheduled: nothing is due again until the interval has passed, and
+    # staying under the threshold doesn't fire again
+    assert scheduler.tick() == []
+    clock.now += scheduler.interval * 2
+    assert scheduler.tick() == []
+    assert (clients['alice-key'].queries, clients['bob-key'].queries) == (2, 2)
+
+
+def test_owners_without_a_key_or_watches_are_not_polled(watchlist, clock):
+    made = []
+    watchlist.add('B000000001', owner='nokey')
+    watchlist.set_keepa_key('nowatches', 'key')
+    scheduler = PriceWatchScheduler(None, watchlist, clock=clock, client_factory=made.append)
+    assert scheduler.tick() == []
+    assert made == []
+
+
+def test_one_client_per_key(watchlist, clock):
+    made = []
+    for owner in ('alice', 'bob'):
+        watchlist.add('B000000001', owner=owner)
+        watchlist.set_keepa_key(owner, 'shared-key')
+    scheduler = PriceWatchScheduler(None, watchlist, clock=clock, client_factory=lambda key: made.append(key) or FakeKeepa(50))
+    scheduler.tick()
+    clock.now += scheduler.interval * 2
+    scheduler.tick()
+    assert made == ['shared-key']
+
+
+def test_claimed_watches_are_polled_once(watchlist, clock):
+    api = FakeKeepa(50)
+    watchlist.add('B000000001', threshold=1e9)
+    first = PriceWatchScheduler(api, watchlist, clock=clock)
+    second = PriceWatchScheduler(api, watchlist, clock=clock)
+    assert len(first.tick()) == 1
+    assert second.tick() == []
+    assert api.queries == 1
+
+
+def test_polls_take_only_the_watchers_fair_share(watchlist, clock):
+    api = FakeKeepa(50)
+    lookups = LookupService(MemoryProductCache())
+    limiter = lookups.limiter(api)
+    limiter.budget, limiter.clock = 10, clock
+    for i in range(8):
+        watchlist.add(f'B00000000{i}')
+    scheduler = PriceWatchScheduler(api, watchlist, clock=clock, lookups=lookups)
+
+    # Someone browsing on the same key: the watcher gets half of it
+    limiter.acquire('shopper')
+    scheduler.tick()
+    assert len(watchlist.due(100, clock.now, claim_for=0)) == 3
+    assert limiter._spent_by_user[WATCHER_USER] == 5
+
+    # The rest is polled once the window has moved on
+    clock.now += limiter.window + 1
+    scheduler.tick()
+    assert watchlist.due(100, clock.now, claim_for=0) == []
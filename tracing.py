@@ -0,0 +1,227 @@
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram bucket bounds in seconds
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Set to a path to append every span as a JSON line
+TRACE_LOG_PATH = os.environ.get("GIRL_MATH_TRACE_LOG")
+
+# Spans finished while a collect() block is active are also appended here, so
+# one Streamlit rerun can show its own timings; fetch.submit_fetch copies the
+# context into worker threads so background lookups are included
+_collector = contextvars.ContextVar("girl_math_span_collector", default=None)
+
+
+class Registry:
+    """Process-wide span timings, counters and gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                span = self.spans[name] = {
+                    'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(SPAN_BUCKETS),
+                }
+            span['count'] += 1
+            span['sum'] += seconds
+            if seconds > span['max']:
+                span['max'] = seconds
+            # Per-bucket counts; they're made cumulative when rendered
+            bucket = bisect.bisect_left(SPAN_BUCKETS, seconds)
+            if bucket < len(SPAN_BUCKETS):
+                span['buckets'][bucket] += 1
+
+    def incr(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def snapshot(self):
+        """Return a copy of everything recorded so far"""
+        with self._lock:
+            return {
+                'spans': {name: dict(span, buckets=list(span['buckets'])) for name, span in self.spans.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+
+registry = Registry()
+
+
+class span:
+    """Time the enclosed block as a named stage
+
+    A plain class rather than @contextmanager, since it wraps hot paths and
+    the generator machinery would cost more than the timing itself.
+    """
+
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        registry.observe(self.name, seconds)
+        collected = _collector.get()
+        if collected is not None:
+            collected.append((self.name, seconds))
+        if TRACE_LOG_PATH:
+            _log_span(self.name, seconds)
+        return False
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name, amount=1, **labels):
+    """Bump a counter, e.g. incr('cache_requests', cache='product', result='hit')"""
+    registry.incr(name, amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    """Record the latest value of something, e.g. Keepa tokens left"""
+    registry.set_gauge(name, value, **labels)
+
+
+def begin_collect():
+    """Start collecting spans for the rest of the current context
+
+    Returns the list spans will be appended to. Streamlit reruns reuse the
+    session's script thread, so calling this at the top of each rerun
+    starts a fresh list for that rerun.
+    """
+    collected = []
+    _collector.set(collected)
+    return collected
+
+
+@contextmanager
+def collect():
+    """Collect (name, seconds) for every span finished inside the block"""
+    collected = []
+    token = _collector.set(collected)
+    try:
+        yield collected
+    finally:
+        _collector.reset(token)
+
+
+_log_lock = threading.Lock()
+
+
+def _log_span(name, seconds):
+    try:
+        line = json.dumps({'ts': time.time(), 'span': name, 'ms': round(seconds * 1000, 3)})
+        with _log_lock, open(TRACE_LOG_PATH, 'a') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        print(f"Error writing trace log: {str(e)}")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def render_openmetrics():
+    """Render the registry in the OpenMetrics / Prometheus text format"""
+    data = registry.snapshot()
+    lines = [
+        '# TYPE girl_math_span_seconds histogram',
+        '# HELP girl_math_span_seconds Time spent in each lookup stage.',
+    ]
+    for name, span_data in sorted(data['spans'].items()):
+        cumulative = 0
+        for bound, count in zip(SPAN_BUCKETS, span_data['buckets']):
+            cumulative += count
+            lines.append(f'girl_math_span_seconds_bucket{_labels([("stage", name), ("le", bound)])} {cumulative}')
+        lines.append(f'girl_math_span_seconds_bucket{_labels([("stage", name), ("le", "+Inf")])} {span_data["count"]}')
+        lines.append(f'girl_math_span_seconds_count{_labels([("stage", name)])} {span_data["count"]}')
+        lines.append(f'girl_math_span_seconds_sum{_labels([("stage", name)])} {span_data["sum"]:.6f}')
+
+    for kind, values in (('counter', data['counters']), ('gauge', data['gauges'])):
+        for metric in sorted({name for name, _ in values}):
+            suffix = '_total' if kind == 'counter' else ''
+            lines.append(f'# TYPE girl_math_{metric} {kind}')
+            for (name, labels), value in sorted(values.items()):
+                if name == metric:
+                    lines.append(f'girl_math_{metric}{suffix}{_labels(labels)} {value}')
+
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def _metrics_handler():
+    """Build the /metrics request handler; http.server is only loaded if metrics are served"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render_openmetrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsHandler
+
+
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """Serve /metrics on a background thread; safe to call on every rerun"""
+    global _metrics_server
+    with _metrics_lock:
+        if _metrics_server is None:
+            from http.server import ThreadingHTTPServer
+            _metrics_server = ThreadingHTTPServer((host, port), _metrics_handler())
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True, name="girl-math-metrics").start()
+        return _metrics_server
@@ -1,123 +1,286 @@
 import re
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-import time
-import numpy as np
+from concurrent.futures import Future
+from fetch import submit_fetch
+from scraper import get_scraper_client
+from stores import STORES
+from matching import keepa_identifiers
+from tracing import span, traced, incr, set_gauge
 
-def extract_asin(amazon_url):
+# Path markers Amazon puts right before the ASIN, on any amazon.* domain:
+# /dp/, /dp/product/, /gp/product/, /gp/aw/d/ (mobile), /gp/offer-listing/,
+# /product-reviews/, /ASIN/, /o/ASIN/, /exec/obidos/ASIN/.
+# They only count after an amazon.* host (and any path segments, like the
+# product slug), or at the start of a bare path like "/dp/B0BDHWDR12"
+_ASIN_MARKER = r'(?:dp(?:/product)?|gp/product|gp/aw/d|gp/offer-listing|product-reviews|(?:o/|exec/obidos/)?ASIN)/'
+_AMAZON_HOST = r'(?:https?://)?(?:[\w-]+\.)*amazon\.[a-z]{2,3}(?:\.[a-z]{2})?(?:/[^\s/?#<>"\']+)*?'
+# Without a marker ("amazon.com/Some-Name/B0BDHWDR12"), a whole path segment
+# on an amazon.* host that looks like an ASIN (B plus nine, at least one a
+# digit) or an ISBN-10
+_ASIN_SEGMENT = r'(B(?=[A-Z]{0,8}\d)[A-Z0-9]{9}|\d{9}[\dX])(?=[/?#\s"\'<>]|$)'
+_ASIN_IN_PATH = (
+    rf'(?<![\w./-])(?:{_AMAZON_HOST}/(?:{_ASIN_MARKER}([A-Z0-9]{{10}})(?![A-Z0-9])|{_ASIN_SEGMENT})'
+    rf'|/{_ASIN_MARKER}([A-Z0-9]{{10}})(?![A-Z0-9]))'
+)
+# Short links that redirect to a product page
+_SHORT_LINK = r'(?:https?://|(?<![\w.-]))(?:www\.)?(?:amzn\.(?:to|eu|asia)|a\.co)/[^\s<>"\')\]]+'
+
+ASIN_RE = re.compile(_ASIN_IN_PATH, re.IGNORECASE)
+SHORT_LINK_RE = re.compile(_SHORT_LINK, re.IGNORECASE)
+# One alternation so a whole text blob is scanned in a single pass
+ASIN_OR_SHORT_LINK_RE = re.compile(f'{_ASIN_IN_PATH}|({_SHORT_LINK})', re.IGNORECASE)
+
+
+def _asin(match):
+    """The ASIN an ASIN_RE / ASIN_OR_SHORT_LINK_RE match found, or None for a short link"""
+    asin = match.group(1) or match.group(2) or match.group(3)
+    return asin.upper() if asin else None
+
+# Resolved short links; they never change, so only the size is bounded
+SHORT_LINK_CACHE_SIZE = 10000
+_short_links = {}
+
+def _short_link_url(url):
+    # Links pasted into prose often pick up the sentence's punctuation
+    url = url.rstrip('.,;:!?')
+    return url if url.startswith('http') else 'https://' + url
+
+def resolve_short_link(url):
+    """Follow an amzn.to / a.co short link and return the ASIN it points at
+
+    Resolved links are kept in a redirect table, so each short link costs
+    at most one request per process. Failed requests aren't kept and are
+    retried next time.
+    """
+    url = _short_link_url(url)
+    if url in _short_links:
+        return _short_links[url]
+
+    try:
+        with span('resolve_short_link'):
+            final_url = get_scraper_client().resolve_redirects(url)
+    except Exception as e:
+        print(f"Error resolving short link: {str(e)}")
+        return None
+    match = ASIN_RE.search(final_url)
+    asin = _asin(match) if match else None
+
+    if len(_short_links) >= SHORT_LINK_CACHE_SIZE:
+        _short_links.clear()
+    _short_links[url] = asin
+    return asin
+
+@traced('extract_asin')
+def extract_asin(amazon_url, resolve_short_links=True):
     """Extract ASIN from Amazon product URL"""
-    # Pattern for ASIN in Amazon URLs
-    patterns = [
-        r'/dp/(\w{10})',
-        r'/gp/product/(\w{10})',
-        r'/ASIN/(\w{10})',
-        r'amazon\.com.*?/(\w{10})(?:/|\?|$)'
-    ]
+    match = ASIN_RE.search(amazon_url)
+    if match:
+        return _asin(match)
     
-    for pattern in patterns:
-        match = re.search(pattern, amazon_url)
+    if resolve_short_links:
+        match = SHORT_LINK_RE.search(amazon_url)
         if match:
-            return match.group(1)
+            return resolve_short_link(match.group(0))
     
     return None
 
-def get_amazon_product_info(api, asin):
-    """Get Amazon product information using Keepa API"""
-    try:
-        # Query the Keepa API
-        products = api.query(asin, domain='US')
-        if not products:
-            return None
-        
-        product = products[0]
-        
-        # Extract the product title
-        title = product.get('title', 'Unknown Product')
-        
-        # Extract price history
-        price_data = product['data']['NEW']
-        
-        # Convert Keepa's price format (in cents) to dollars
-        valid_prices = [p/100 for p in price_data if p and p > 0]
-        
-        if not valid_prices:
-            return None
-        
-        current_price = valid_prices[-1]
-        peak_price = max(valid_prices)
-        lowest_price = min(valid_prices)
-        
-        return {
-            'title': title,
-            'price_data': valid_prices,
-            'current_price': current_price,
-            'peak_price': peak_price,
-            'lowest_price': lowest_price,
-            'asin': asin
-        }
+@traced('extract_asins')
+def extract_asins(text, resolve_short_links=True):
+    """Extract every ASIN from a blob of text (an email, a spreadsheet export...)
+
+    Scans the text once for product links and short links, and returns the
+    ASINs deduplicated in the order they first appear. Short links that
+    aren't resolved yet are resolved concurrently in the fetch pool.
+    """
+    found = []
+    pending = {}
+    for match in ASIN_OR_SHORT_LINK_RE.finditer(text):
+        asin, short_link = _asin(match), match.group(4)
+        if asin:
+            found.append(asin)
+        elif resolve_short_links:
+            url = _short_link_url(short_link)
+            if url in _short_links:
+                found.append(_short_links[url])
+            else:
+                if url not in pending:
+                    pending[url] = submit_fetch(resolve_short_link, url)
+                found.append(pending[url])
+    # Waiting on the futures in paste order keeps the ASINs in that order
+    asins = [item.result() if isinstance(item, Future) else item for item in found]
+    return list(dict.fromkeys(asin for asin in asins if asin))
+
+def extract_asins_from_file(path, resolve_short_links=True):
+    """extract_asins over a whole file"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return extract_asins(f.read(), resolve_short_links)
+
+# Keepa accepts at most 100 ASINs per product request
+KEEPA_MAX_ASINS_PER_QUERY = 100
+
+def parse_keepa_product(product, asin=None):
+    """Turn a raw Keepa product into our product info dict"""
+    # Extract the product title
+    title = product.get('title', 'Unknown Product')
     
-    except Exception as e:
-        print(f"Error getting Amazon product info: {str(e)}")
+    # Extract price history, cleaned and scaled to dollars in one pass
+    from price_series import PriceSeries
+    price_series = PriceSeries.from_keepa(product)
+    
+    return build_product_info(title, price_series, asin or product.get('asin'), keepa_identifiers(product))
+
+def build_product_info(title, price_series, asin, identifiers=None):
+    """Assemble the product info dict from a title and a PriceSeries
+
+    identifiers holds whatever brand, model and upc Keepa knows, used to
+    match the product at other stores. deal holds analytics.deal_stats,
+    computed once here so cached products carry it.
+    """
+    if price_series is None or price_series.empty:
         return None
+    
+    from analytics import deal_stats
+    
+    return {
+        'title': title or 'Unknown Product',
+        'price_series': price_series,
+        'price_data': price_series.prices,
+        **price_series.stats(),
+        'asin': asin,
+        'identifiers': identifiers or {},
+        'deal': deal_stats(price_series),
+    }
+
+def _track_keepa_tokens(api, tokens_before):
+    """Record how many Keepa tokens a query spent and how many are left"""
+    tokens_after = getattr(api, 'tokens_left', None)
+    if not isinstance(tokens_after, (int, float)):
+        return
+    set_gauge('keepa_tokens_left', tokens_after)
+    if isinstance(tokens_before, (int, float)) and tokens_before > tokens_after:
+        incr('keepa_tokens_used', tokens_before - tokens_after)
+
+@traced('get_amazon_product_info')
+def get_amazon_product_info(api, asin, cache=None, domain='US', history=None, refresh=False):
+    """Get Amazon product information using Keepa API
+
+    If a cache is given, a fresh entry for (asin, domain) is returned
+    without querying Keepa, and new results are stored in it. If a
+    PriceHistoryStore is given as history, Keepa is only asked for points
+    newer than what is stored locally and the full series comes from disk.
+    refresh skips the cache and makes the history sync ask Keepa even if
+    it synced recently.
+    """
+    if cache is not None and not refresh:
+        cached = cache.get(asin, domain)
+        incr('cache_requests', cache='product', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return cached
 
-def search_walmart(item_title):
-    """Search Walmart for a product and return the price"""
     try:
-        # Limit the query to the first few words to improve search results
-        words = item_title.split()
-        query = ' '.join(words[:6])
-        
-        # Format search query
-        query = query.replace(' ', '+')
-        url = f"https://www.walmart.com/search?q={query}"
-        
-        # Set headers to mimic a browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': 'https://www.walmart.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        
-        # Send request
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        # Check if request was successful
-        if response.status_code != 200:
-            return None
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Different possible selectors for Walmart prices
-        price_selectors = [
-            'span[data-automation-id="product-price"]',
-            'span.price-characteristic',
-            'span.price-group',
-            'div.product-price-container span.price'
-        ]
-        
-        # Try each selector
-        for selector in price_selectors:
-            prices = soup.select(selector)
-            if prices and len(prices) > 0:
-                return prices[0].text.strip()
-        
-        return None
+        tokens_before = getattr(api, 'tokens_left', None)
+        if history is not None:
+            # Incremental sync against the local store
+            with span('keepa_sync'):
+                title, price_series = history.sync(api, asin, domain, force=refresh)
+            _track_keepa_tokens(api, tokens_before)
+            product_info = build_product_info(title, price_series, asin, history.identifiers(asin, domain))
+        else:
+            # Query the Keepa API
+            with span('keepa_query'):
+                products = api.query(asin, domain=domain)
+            _track_keepa_tokens(api, tokens_before)
+            if not products:
+                return None
+            
+            with span('keepa_parse'):
+                product_info = parse_keepa_product(products[0], asin)
+
+        if product_info is not None and cache is not None:
+            cache.set(asin, product_info, domain)
+
+        return product_info
     
     except Exception as e:
-        print(f"Error searching Walmart: {str(e)}")
+        incr('errors', stage='get_amazon_product_info')
+        print(f"Error getting Amazon product info: {str(e)}")
         return None
 
-def girl_math_logic(current_price, peak_price, lowest_price):
-    """Apply Girl Math logic to calculate savings"""
-    savings_from_peak = peak_price - current_price
-    if peak_price > 0:  # Avoid division by zero
-        savings_percentage = (savings_from_peak / peak_price) * 100
+def get_amazon_products_info(api, asins, cache=None, domain='US', chunk_size=KEEPA_MAX_ASINS_PER_QUERY):
+    """Get Amazon product information for many ASINs at once
+
+    ASINs are deduplicated (None values from extract_asin are dropped) and
+    queried in chunks of up to chunk_size per Keepa request. This is a
+    generator yielding (asin, product_info) pairs as each chunk arrives;
+    product_info is None for products Keepa couldn't price.
+    """
+    # Dedupe while keeping the order the user pasted them in
+    unique_asins = list(dict.fromkeys(a.strip().upper() for a in asins if a))
+
+    pending = []
+    for asin in unique_asins:
+        cached = cache.get(asin, domain) if cache is not None else None
+        if cache is not None:
+            incr('cache_requests', cache='product', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            yield asin, cached
+        else:
+            pending.append(asin)
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            tokens_before = getattr(api, 'tokens_left', None)
+            with span('keepa_batch_query'):
+                products = api.query(chunk, domain=domain)
+            _track_keepa_tokens(api, tokens_before)
+        except Exception as e:
+            incr('errors', stage='get_amazon_products_info')
+            print(f"Error getting Amazon product info: {str(e)}")
+            for asin in chunk:
+                yield asin, None
+            continue
+
+        products_by_asin = {p.get('asin'): p for p in products or []}
+        for asin in chunk:
+            product = products_by_asin.get(asin)
+            product_info = None
+            if product is not None:
+                try:
+                    product_info = parse_keepa_product(product, asin)
+                except Exception as e:
+                    print(f"Error parsing Amazon product {asin}: {str(e)}")
+
+            if product_info is not None and cache is not None:
+                cache.set(asin, product_info, domain)
+
+            yield asin, product_info
+
+@traced('search_walmart')
+def search_walmart(item_title, brand=None, model=None, upc=None):
+    """Search Walmart for a product and return the price of the best match
+
+    Returns None if Walmart has no match, and raises stores.StoreSearchError
+    if Walmart couldn't be searched.
+    """
+    result = STORES['walmart'].search(item_title, brand=brand, model=model, upc=upc)
+    return result['price_text'] if result else None
+
+@traced('girl_math_logic')
+def girl_math_logic(current_price, peak_price, lowest_price, deal=None):
+    """Apply Girl Math logic to calculate savings
+
+    With deal stats (analytics.deal_stats) savings are counted from the
+    price it usually sold for over the last year instead of the all-time
+    peak, so one old price spike doesn't inflate them.
+    """
+    if deal is not None:
+        reference_price = deal['reference_price']
+        savings_from_peak = max(reference_price - current_price, 0)
+    else:
+        reference_price = peak_price
+        savings_from_peak = peak_price - current_price
+    if reference_price > 0:  # Avoid division by zero
+        savings_percentage = (savings_from_peak / reference_price) * 100
     else:
         savings_percentage = 0
     
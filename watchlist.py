@@ -0,0 +1,476 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from fetch import submit_fetch
+from service import KEEPA_TOKENS_PER_PRODUCT, KeepaBudgetExceeded
+from utils import get_amazon_products_info, search_walmart, KEEPA_MAX_ASINS_PER_QUERY
+from tracing import span, incr
+
+DEFAULT_WATCHLIST_PATH = os.environ.get("GIRL_MATH_WATCHLIST_PATH", ".girl_math_watchlist.sqlite")
+# How often each watched product is re-polled, +/- jitter so polls spread out
+DEFAULT_POLL_INTERVAL = 6 * 60 * 60
+DEFAULT_JITTER = 0.2
+# How often the scheduler wakes up to look for due products
+DEFAULT_TICK = 60
+# Most products polled per tick, and Keepa tokens we always leave untouched
+DEFAULT_MAX_PER_TICK = 5 * KEEPA_MAX_ASINS_PER_QUERY
+DEFAULT_TOKEN_RESERVE = 20
+# Walmart prices move slower than we poll, reuse them for this long (longer
+# than the poll interval, so most polls don't search Walmart at all)
+WALMART_TTL = 24 * 60 * 60
+# Most Walmart searches per tick, run concurrently in the fetch pool; the
+# rest keep their last Walmart price until a later tick
+DEFAULT_WALMART_PER_TICK = 20
+
+# Watches added without an owner, e.g. from a script
+DEFAULT_OWNER = ''
+# How long a scheduler holds the watches it claimed before they're up for grabs again
+DEFAULT_CLAIM = 15 * 60
+# Who the watcher's polls are charged to in the lookup service's fair-share limiter
+WATCHER_USER = 'watcher'
+
+# Event kinds
+BELOW_THRESHOLD = 'below_threshold'
+AT_LOWEST_PRICE = 'at_lowest_price'
+
+
+_WATCH_COLUMNS = (
+    "asin, domain, title, threshold, notify_on_low, last_price, lowest_price, "
+    "walmart_price, last_alert, last_polled, next_poll"
+)
+
+
+class Watchlist:
+    """Watched products and the alerts they have fired, stored in SQLite
+
+    Every watch and alert belongs to an owner (a user or session), so
+    users of a shared deployment only see and pay for their own watches.
+    """
+
+    def __init__(self, path=DEFAULT_WATCHLIST_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS watches (
+                owner TEXT NOT NULL DEFAULT '',
+                asin TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                title TEXT,
+                threshold REAL,
+                notify_on_low INTEGER NOT NULL DEFAULT 1,
+                last_price REAL,
+                lowest_price REAL,
+                walmart_price TEXT,
+                last_alert TEXT,
+                last_polled REAL,
+                next_poll REAL NOT NULL,
+                PRIMARY KEY (owner, asin, domain)
+            );
+            CREATE TABLE IF NOT EXISTS owners (
+                owner TEXT PRIMARY KEY,
+                keepa_key TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS watch_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL DEFAULT '',
+                asin TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                title TEXT,
+                current_price REAL,
+                threshold REAL,
+                lowest_price REAL,
+                walmart_price TEXT,
+                created_at REAL NOT NULL
+            );
+        """)
+        # Watchlists from before owners were kept; the owner is part of the
+        # primary key, so the watches table has to be rebuilt
+        if 'owner' not in {row[1] for row in self._conn.execute("PRAGMA table_info(watches)")}:
+            self._conn.executescript(f"""
+                ALTER TABLE watches RENAME TO watches_unowned;
+                DROP INDEX IF EXISTS watches_next_poll;
+                CREATE TABLE watches (
+                    owner TEXT NOT NULL DEFAULT '',
+                    asin TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    title TEXT,
+                    threshold REAL,
+                    notify_on_low INTEGER NOT NULL DEFAULT 1,
+                    last_price REAL,
+                    lowest_price REAL,
+                    walmart_price TEXT,
+                    last_alert TEXT,
+                    last_polled REAL,
+                    next_poll REAL NOT NULL,
+                    PRIMARY KEY (owner, asin, domain)
+                );
+                INSERT INTO watches ({_WATCH_COLUMNS}) SELECT {_WATCH_COLUMNS} FROM watches_unowned;
+                DROP TABLE watches_unowned;
+            """)
+        if 'owner' not in {row[1] for row in self._conn.execute("PRAGMA table_info(watch_events)")}:
+            self._conn.execute("ALTER TABLE watch_events ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        self._conn.executescript("""
+            CREATE INDEX IF NOT EXISTS watches_next_poll ON watches (owner, next_poll);
+            CREATE INDEX IF NOT EXISTS watch_events_owner ON watch_events (owner, id);
+        """)
+        self._conn.commit()
+
+    def add(self, asin, threshold=None, notify_on_low=True, title=None, current_price=None, domain='US', owner=DEFAULT_OWNER):
+        """Start (or update) watching a product; it is polled on the next tick"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO watches (owner, asin, domain, title, threshold, notify_on_low, last_price, next_poll) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, asin, domain) DO UPDATE SET threshold = excluded.threshold, "
+                "notify_on_low = excluded.notify_on_low, title = COALESCE(excluded.title, title), last_alert = NULL",
+                (owner, asin.upper(), domain.upper(), title, threshold, int(notify_on_low), current_price, self.clock()),
+            )
+            self._conn.commit()
+
+    def set_keepa_key(self, owner, keepa_key):
+        """Poll owner's watches on this Keepa key, also after a restart"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO owners (owner, keepa_key) VALUES (?, ?) "
+                "ON CONFLICT (owner) DO UPDATE SET keepa_key = excluded.keepa_key",
+                (owner, keepa_key),
+            )
+            self._conn.commit()
+
+    def keepa_key(self, owner=DEFAULT_OWNER):
+        with self._lock:
+            row = self._conn.execute("SELECT keepa_key FROM owners WHERE owner = ?", (owner,)).fetchone()
+        return row[0] if row else None
+
+    def keepa_keys(self):
+        """Return {owner: Keepa key} for every owner who has watches"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT owner, keepa_key FROM owners o WHERE EXISTS (SELECT 1 FROM watches w WHERE w.owner = o.owner)"
+            ).fetchall())
+
+    def remove(self, asin, domain='US', owner=DEFAULT_OWNER):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM watches WHERE owner = ? AND asin = ? AND domain = ?", (owner, asin.upper(), domain.upper())
+            )
+            self._conn.commit()
+
+    def items(self, owner=DEFAULT_OWNER):
+        """Return every product owner watches as a list of dicts"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM watches WHERE owner = ? ORDER BY title", (owner,))]
+
+    def count(self, owner=DEFAULT_OWNER):
+        """How many products owner watches"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM watches WHERE owner = ?", (owner,)).fetchone()[0]
+
+    def due(self, limit, now=None, owner=DEFAULT_OWNER, claim_for=DEFAULT_CLAIM):
+        """Claim up to limit of owner's watches whose next poll time has passed, most overdue first
+
+        Claimed watches have next_poll pushed claim_for seconds out in the
+        same transaction, so another scheduler (or process) doesn't poll
+        them too. record_poll sets the real next poll; a poll that never
+        finishes is retried once the claim runs out.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = [dict(row) for row in self._conn.execute(
+                    "SELECT * FROM watches WHERE owner = ? AND next_poll <= ? ORDER BY next_poll LIMIT ?",
+                    (owner, now, limit),
+                )]
+                self._conn.executemany(
+                    "UPDATE watches SET next_poll = ? WHERE owner = ? AND asin = ? AND domain = ?",
+                    ((now + claim_for, row['owner'], row['asin'], row['domain']) for row in rows),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return rows
+
+    def release(self, watches):
+        """Hand back claimed watches that won't be polled this time, due as they were"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE watches SET next_poll = ? WHERE owner = ? AND asin = ? AND domain = ?",
+                ((watch['next_poll'], watch['owner'], watch['asin'], watch['domain']) for watch in watches),
+            )
+            self._conn.commit()
+
+    def record_poll(self, watch, next_poll, current_price=None, lowest_price=None, walmart_price=None, title=None, last_alert=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE watches SET last_price = COALESCE(?, last_price), lowest_price = COALESCE(?, lowest_price), "
+                "walmart_price = COALESCE(?, walmart_price), title = COALESCE(?, title), "
+                "last_alert = COALESCE(?, last_alert), last_polled = ?, next_poll = ? "
+                "WHERE owner = ? AND asin = ? AND domain = ?",
+                (current_price, lowest_price, walmart_price, title, last_alert, self.clock(), next_poll,
+                 watch['owner'], watch['asin'], watch['domain']),
+            )
+            self._conn.commit()
+
+    def record_event(self, event):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO watch_events (owner, asin, domain, kind, title, current_price, threshold, lowest_price, walmart_price, created_at) "
+                "VALUES (:owner, :asin, :domain, :kind, :title, :current_price, :threshold, :lowest_price, :walmart_price, :created_at)",
+                event,
+            )
+            self._conn.commit()
+
+    def events(self, limit=50, owner=DEFAULT_OWNER):
+        """Return owner's most recent alerts, newest first"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(
+                "SELECT * FROM watch_events WHERE owner = ? ORDER BY id DESC LIMIT ?", (owner, limit)
+            )]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM watches").fetchone()[0]
+
+
+def check_alerts(watch, current_price, lowest_price):
+    """Return the event kinds a fresh price should fire for a watch
+
+    A threshold alert fires when the price crosses the threshold (or is
+    already under it the first time we look), not on every poll while it
+    stays under. A lowest-price alert fires once per new low.
+    """
+    kinds = []
+    threshold = watch.get('threshold')
+    previous = watch.get('last_price')
+    if threshold is not None and current_price <= threshold:
+        if previous is None or previous > threshold or watch.get('last_alert') is None:
+            kinds.append(BELOW_THRESHOLD)
+    if watch.get('notify_on_low') and current_price <= lowest_price:
+        if watch.get('last_alert') != f"{AT_LOWEST_PRICE}:{current_price:.2f}":
+            kinds.append(AT_LOWEST_PRICE)
+    return kinds
+
+
+def _keepa_client(keepa_key):
+    import keepa
+    return keepa.Keepa(keepa_key)
+
+
+class PriceWatchScheduler:
+    """Background thread that re-polls due watches in batched Keepa queries
+
+    One scheduler serves the whole process. Each owner's watches are
+    polled on the Keepa key stored for that owner (Watchlist.set_keepa_key),
+    so everyone pays for their own watches and they keep being polled
+    after a restart; client_factory turns a key into a client, one per key.
+    api, if given, polls watches with no owner and no stored key. With
+    lookups (a service.LookupService) the polls are charged to WATCHER_USER's
+    fair share of each key, so the watcher never takes more of a key than
+    one interactive user can. Each tick claims the most overdue watches, capped by
+    max_per_tick and by each client's Keepa tokens left above
+    token_reserve, and looks them up with one Keepa request per 100
+    products. Every watch is then rescheduled interval seconds out, +/-
+    jitter, so a large watchlist spreads its polls evenly instead of
+    bunching up. Listeners get each fired event.
+    """
+
+    def __init__(self, api, watchlist, interval=DEFAULT_POLL_INTERVAL, jitter=DEFAULT_JITTER,
+                 tick=DEFAULT_TICK, max_per_tick=DEFAULT_MAX_PER_TICK, token_reserve=DEFAULT_TOKEN_RESERVE,
+                 check_walmart=False, walmart_per_tick=DEFAULT_WALMART_PER_TICK, clock=time.time, rng=None,
+                 client_factory=None, lookups=None):
+        self.api = api
+        self.lookups = lookups
+        self.client_factory = client_factory or _keepa_client
+        self._clients = {}
+        self.watchlist = watchlist
+        self.interval = interval
+        self.jitter = jitter
+        self.tick_seconds = tick
+        self.max_per_tick = max_per_tick
+        self.token_reserve = token_reserve
+        self.check_walmart = check_walmart
+        self.walmart_per_tick = walmart_per_tick
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.listeners = []
+        self._walmart_cache = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def owner_clients(self):
+        """Return {owner: Keepa client} for every owner whose watches can be polled"""
+        clients = {DEFAULT_OWNER: self.api} if self.api is not None else {}
+        for owner, key in self.watchlist.keepa_keys().items():
+            if key not in self._clients:
+                try:
+                    self._clients[key] = self.client_factory(key)
+                except Exception as e:
+                    print(f"Error creating a Keepa client for watches: {str(e)}")
+                    continue
+            clients[owner] = self._clients[key]
+        return clients
+
+    def add_listener(self, callback):
+        """Call callback(event_dict) for every alert fired"""
+        self.listeners.append(callback)
+
+    def next_poll_time(self, now):
+        spread = self.interval * self.jitter
+        return now + self.interval + self.rng.uniform(-spread, spread)
+
+    def poll_budget(self, api=None):
+        """How many products api may poll this tick without eating the token reserve"""
+        api = self.api if api is None else api
+        tokens_left = getattr(api, 'tokens_left', None)
+        # keepa.Keepa reports 0 tokens until its first request; its status
+        # only gets a token count once Keepa has answered
+        status = getattr(api, 'status', None)
+        if not isinstance(tokens_left, (int, float)) or (status is not None and getattr(status, 'tokensLeft', None) is None):
+            return self.max_per_tick
+        return max(0, min(self.max_per_tick, int(tokens_left) - self.token_reserve))
+
+    def _charge(self, api, watches):
+        """Charge polling watches to the watcher's fair share of api's key
+
+        Watches over the share are handed back for a later tick.
+        """
+        if self.lookups is None or not watches:
+            return watches
+        try:
+            granted = self.lookups.limiter(api).grant(WATCHER_USER, len(watches) * KEEPA_TOKENS_PER_PRODUCT)
+        except KeepaBudgetExceeded:
+            granted = 0
+        granted //= KEEPA_TOKENS_PER_PRODUCT
+        if granted < len(watches):
+            incr('watch_polls_deferred', len(watches) - granted)
+            self.watchlist.release(watches[granted:])
+        return watches[:granted]
+
+    def _refresh_walmart_prices(self, infos, now):
+        """Search Walmart for up to walmart_per_tick products whose price is stale"""
+        self._walmart_cache = {
+            title: entry for title, entry in self._walmart_cache.items() if now - entry[0] < WALMART_TTL
+        }
+        stale = {}
+        for info in infos:
+            if info['title'] not in self._walmart_cache and len(stale) < self.walmart_per_tick:
+                stale.setdefault(info['title'], info.get('identifiers') or {})
+        futures = {title: submit_fetch(search_walmart, title, **identifiers) for title, identifiers in stale.items()}
+        for title, future in futures.items():
+            try:
+                self._walmart_cache[title] = (now, future.result())
+            except Exception as e:
+                print(f"Error checking Walmart for a watch: {str(e)}")
+
+    def tick(self):
+        """Poll whatever is due; returns the events fired"""
+        now = self.clock()
+        # Owners sharing a Keepa key share its budget
+        budgets = {}
+        clients = {}
+        due = []
+        for owner, api in self.owner_clients().items():
+            if id(api) not in budgets:
+                budgets[id(api)] = self.poll_budget(api)
+            limit = min(budgets[id(api)], self.max_per_tick - len(due))
+            if limit <= 0:
+                continue
+            claimed = self._charge(api, self.watchlist.due(limit, now, owner=owner))
+            budgets[id(api)] -= len(claimed)
+            clients[id(api)] = api
+            due.extend((id(api), watch) for watch in claimed)
+
+        if not due:
+            if budgets and not any(budget > 0 for budget in budgets.values()):
+                incr('watch_ticks_skipped', reason='token_budget')
+            return []
+
+        events = []
+        # One Keepa batch per client and domain; a product several owners
+        # watch with the same key is looked up once
+        batches = {}
+        for client, watch in due:
+            batches.setdefault((client, watch['domain']), {}).setdefault(watch['asin'], []).append(watch)
+
+        with span('watch_tick'):
+            polled = []
+            for (client, domain), by_asin in batches.items():
+                for asin, info in get_amazon_products_info(clients[client], list(by_asin), domain=domain):
+                    polled.extend((watch, info) for watch in by_asin[asin])
+            if self.check_walmart:
+                self._refresh_walmart_prices([info for _, info in polled if info is not None], now)
+            for watch, info in polled:
+                events.extend(self._update(watch, info, now))
+
+        incr('watch_polls', len(due))
+        return events
+
+    def _update(self, watch, info, now):
+        next_poll = self.next_poll_time(now)
+        if info is None:
+            self.watchlist.record_poll(watch, next_poll)
+            return []
+
+        current_price = info['current_price']
+        lowest_price = info['lowest_price']
+        # None keeps the stored Walmart price when this tick didn't search
+        cached = self._walmart_cache.get(info['title']) if self.check_walmart else None
+        walmart_price = cached[1] if cached is not None else None
+
+        events = []
+        last_alert = None
+        for kind in check_alerts(watch, current_price, lowest_price):
+            event = {
+                'owner': watch['owner'],
+                'asin': watch['asin'],
+                'domain': watch['domain'],
+                'kind': kind,
+                'title': info['title'],
+                'current_price': current_price,
+                'threshold': watch.get('threshold'),
+                'lowest_price': lowest_price,
+                'walmart_price': walmart_price if walmart_price is not None else watch.get('walmart_price'),
+                'created_at': now,
+            }
+            self.watchlist.record_event(event)
+            events.append(event)
+            last_alert = f"{kind}:{current_price:.2f}"
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    print(f"Error in watch listener: {str(e)}")
+
+        self.watchlist.record_poll(
+            watch, next_poll, current_price=current_price, lowest_price=lowest_price,
+            walmart_price=walmart_price, title=info['title'], last_alert=last_alert,
+        )
+        return events
+
+    def start(self):
+        """Start polling in a daemon thread; safe to call more than once"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="girl-math-watch")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Error polling watchlist: {str(e)}")
+            self._stop.wait(self.tick_seconds)